@@ -1,10 +1,15 @@
 from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Query
-from models import Agent, Session
+from fastapi.responses import StreamingResponse
+from models import Agent, Session, TrainingJob
 from services.agent_service import AgentService
 from services.session_service import SessionService
+from services.training_jobs import training_jobs
+from services.csv_ingestion import spool_upload
 import logging
+import os
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
+import json
 
 router = APIRouter(prefix="/agents", tags=["agents"])
 agent_service = AgentService()
@@ -18,6 +23,10 @@ class ChatRequest(BaseModel):
 class TrainingUrlRequest(BaseModel):
     url: str
 
+class TrainingUrlsRequest(BaseModel):
+    urls: List[str] = []
+    sitemap: Optional[str] = None
+
 @router.post("/", response_model=Agent)
 async def create_agent(agent: Agent):
     try:
@@ -36,7 +45,7 @@ async def get_agent(agent_id: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.post("/{agent_id}/training")
+@router.post("/{agent_id}/training", status_code=202)
 async def train_agent(
     agent_id: str,
     file: UploadFile = File(...),
@@ -53,25 +62,83 @@ async def train_agent(
         if not agent:
             raise HTTPException(status_code=404, detail="Agente no encontrado")
         
-        file_content = await file.read()
+        csv_path = await spool_upload(file)
         
-        result = await agent_service.process_training_file(agent_id, file_content, filename)
+        try:
+            job = await training_jobs.submit(
+                agent_service.db,
+                agent_id,
+                "file",
+                filename,
+                lambda progress: agent_service.process_training_file(agent_id, csv_path, filename, progress),
+                cleanup_path=csv_path
+            )
+        except Exception:
+            os.unlink(csv_path)
+            raise
         
-        return result
+        return TrainingJob.to_response(job)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.post("/{agent_id}/training/url")
+@router.post("/{agent_id}/training/url", status_code=202)
 async def train_agent_from_url(
     agent_id: str,
     request: TrainingUrlRequest
 ):
     try:
-        result = await agent_service.process_training_url(agent_id, request.url)
-        return result
+        agent = await agent_service.get_agent(agent_id)
+        if not agent:
+            raise HTTPException(status_code=404, detail="Agente no encontrado")
+
+        job = await training_jobs.submit(
+            agent_service.db,
+            agent_id,
+            "url",
+            request.url,
+            lambda progress: agent_service.process_training_url(agent_id, request.url, progress)
+        )
+        return TrainingJob.to_response(job)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/{agent_id}/training/urls", status_code=202)
+async def train_agent_from_urls(
+    agent_id: str,
+    request: TrainingUrlsRequest
+):
+    try:
+        if not request.urls and not request.sitemap:
+            raise HTTPException(status_code=400, detail="Se requiere una lista de URLs o un sitemap")
+
+        agent = await agent_service.get_agent(agent_id)
+        if not agent:
+            raise HTTPException(status_code=404, detail="Agente no encontrado")
+
+        job = await training_jobs.submit(
+            agent_service.db,
+            agent_id,
+            "urls",
+            request.sitemap or f"{len(request.urls)} URLs",
+            lambda progress: agent_service.process_training_urls(agent_id, request.urls, request.sitemap, progress)
+        )
+        return TrainingJob.to_response(job)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/{agent_id}/training/jobs/{job_id}")
+async def get_training_job(agent_id: str, job_id: str):
+    job = await TrainingJob.find(agent_service.db, agent_id, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Training job not found")
+    return TrainingJob.to_response(job)
+
 @router.post("/{agent_id}/chat")
 async def chat(agent_id: str, request: ChatRequest):
     try:
@@ -83,4 +150,21 @@ async def chat(agent_id: str, request: ChatRequest):
         )
         return result
     except Exception as e:
-        raise HTTPException(status_code=400, detail=str(e)) 
\ No newline at end of file
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/{agent_id}/chat/stream")
+async def chat_stream(agent_id: str, request: ChatRequest):
+    async def event_stream():
+        async for event in agent_service.chat_stream(
+            agent_id,
+            request.conversation_id,
+            request.message,
+            request.channel
+        ):
+            yield f"event: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
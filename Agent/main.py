@@ -8,7 +8,14 @@ import logging
 from services.queue_service import QueueService
 from services.agent_service import AgentService
 import threading
+import asyncio
+from models.agent_cache import agent_cache
+from models.database import Database
+from services.metrics import metrics
+from services.training_jobs import training_jobs
+from models.training_job import TrainingJob
 from scripts.init_default_agent import init_default_agent
+from scripts.init_indexes import init_indexes
 
 load_dotenv()
 
@@ -33,8 +40,11 @@ app.add_middleware(
 
 app.include_router(agent_router)
 
-rabbitmq_service = QueueService()
+embedded_consumer = os.getenv("AGENT_EMBEDDED_CONSUMER", "true").lower() == "true"
+rabbitmq_service = QueueService() if embedded_consumer else None
 agent_service = AgentService()
+watch_agents = os.getenv("AGENT_CACHE_CHANGE_STREAM", "true").lower() == "true"
+background_tasks = []
 
 def start_rabbitmq_consumer():
     try:
@@ -44,18 +54,42 @@ def start_rabbitmq_consumer():
 
 @app.on_event("startup")
 async def startup_event():
+    try:
+        await init_indexes()
+    except Exception as e:
+        logging.error(f"Error initializing indexes: {str(e)}")
+
+    try:
+        interrupted = await TrainingJob.mark_interrupted(agent_service.db)
+        if interrupted:
+            logging.warning(f"Marked {interrupted} unfinished training jobs as interrupted")
+    except Exception as e:
+        logging.error(f"Error recovering training jobs: {str(e)}")
+
     try:
         await init_default_agent()
     except Exception as e:
         logging.error(f"Error initializing default agent: {str(e)}")
+
+    if watch_agents:
+        background_tasks.append(asyncio.create_task(agent_cache.watch(agent_service.db)))
     
+    if not embedded_consumer:
+        logging.info("Embedded RabbitMQ consumer disabled, run worker.py to process the queue")
+        return
+
     rabbitmq_thread = threading.Thread(target=start_rabbitmq_consumer)
     rabbitmq_thread.daemon = True
     rabbitmq_thread.start()
 
 @app.on_event("shutdown")
 async def shutdown_event():
-    rabbitmq_service.close()
+    for task in background_tasks:
+        task.cancel()
+    await training_jobs.shutdown()
+    if embedded_consumer:
+        rabbitmq_service.close()
+    Database.close()
 
 @app.get("/")
 async def root():
@@ -65,6 +99,10 @@ async def root():
 async def health_check():
     return {"status": "healthy", "service": "Agent"}
 
+@app.get("/metrics")
+async def get_metrics():
+    return metrics.snapshot()
+
 if __name__ == "__main__":
     port = int(os.getenv("PORT", 3000))
     uvicorn.run(app, host="0.0.0.0", port=port)
@@ -1,5 +1,10 @@
 from .database import Database
 from .agent import Agent, KnowledgeBase, FileCounts
+from .agent_cache import AgentCache, agent_cache
 from .session import Session, Message
+from .session_archive import SessionArchive
+from .training_job import TrainingJob
+from .knowledge_manifest import KnowledgeManifest
+from .processed_message import ProcessedMessage
 
-__all__ = ['Database', 'Agent', 'KnowledgeBase', 'FileCounts'] 
\ No newline at end of file
+__all__ = ['Database', 'Agent', 'KnowledgeBase', 'FileCounts', 'AgentCache', 'agent_cache', 'SessionArchive', 'TrainingJob', 'KnowledgeManifest', 'ProcessedMessage'] 
\ No newline at end of file
@@ -2,7 +2,9 @@ from pydantic import BaseModel, Field
 from typing import List, Optional
 from datetime import datetime, UTC
 from bson import ObjectId
+from pymongo import ASCENDING
 from models.database import Database
+from models.agent_cache import agent_cache
 
 class FileCounts(BaseModel):
     in_progress: int
@@ -33,6 +35,14 @@ class Agent(BaseModel):
     class Config:
         collection = "agents"
 
+    @classmethod
+    async def ensure_indexes(cls, db: Database) -> None:
+        await db.agents.create_index(
+            [("phone_number", ASCENDING)],
+            name="phone_number_unique",
+            unique=True
+        )
+
     @classmethod
     async def create(cls, db: Database, agent_dict: dict) -> dict:
         await db.agents.insert_one(agent_dict)
@@ -46,9 +56,28 @@ class Agent(BaseModel):
     async def find_by_phone(cls, db: Database, phone_number: str) -> Optional[dict]:
         return await db.agents.find_one({"phone_number": phone_number})
 
+    @classmethod
+    async def get_cached(cls, db: Database, agent_id: str) -> Optional[dict]:
+        agent_dict = agent_cache.get(agent_id)
+        if agent_dict is None:
+            agent_dict = await cls.find_by_id(db, agent_id)
+            if agent_dict:
+                agent_cache.put(agent_dict)
+        return agent_dict
+
+    @classmethod
+    async def get_cached_by_phone(cls, db: Database, phone_number: str) -> Optional[dict]:
+        agent_dict = agent_cache.get_by_phone(phone_number)
+        if agent_dict is None:
+            agent_dict = await cls.find_by_phone(db, phone_number)
+            if agent_dict:
+                agent_cache.put(agent_dict)
+        return agent_dict
+
     @classmethod
     async def update(cls, db: Database, agent_id: str, update_data: dict) -> None:
         await db.agents.update_one(
             {"_id": ObjectId(agent_id)},
             {"$set": update_data}
-        ) 
\ No newline at end of file
+        )
+        agent_cache.invalidate(agent_id) 
\ No newline at end of file
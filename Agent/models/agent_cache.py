@@ -0,0 +1,98 @@
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from pymongo.errors import OperationFailure
+import asyncio
+import logging
+import os
+import threading
+import time
+
+
+class AgentCache:
+    def __init__(self):
+        self.max_size = int(os.getenv("AGENT_CACHE_MAX_SIZE", 1000))
+        self.ttl = float(os.getenv("AGENT_CACHE_TTL", 60))
+        self.retry_delay = float(os.getenv("AGENT_CACHE_WATCH_RETRY_DELAY", 10))
+        self._entries: "OrderedDict[str, Tuple[float, dict]]" = OrderedDict()
+        self._phones: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._watching = False
+
+    def get(self, agent_id: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(agent_id)
+            if entry is None:
+                return None
+            expires_at, agent_dict = entry
+            if expires_at < time.monotonic():
+                self._remove(agent_id)
+                return None
+            self._entries.move_to_end(agent_id)
+            return agent_dict
+
+    def get_by_phone(self, phone_number: str) -> Optional[dict]:
+        with self._lock:
+            agent_id = self._phones.get(phone_number)
+        if agent_id is None:
+            return None
+        return self.get(agent_id)
+
+    def put(self, agent_dict: dict) -> None:
+        agent_id = str(agent_dict["_id"])
+        with self._lock:
+            self._remove(agent_id)
+            self._entries[agent_id] = (time.monotonic() + self.ttl, agent_dict)
+            if agent_dict.get("phone_number"):
+                self._phones[agent_dict["phone_number"]] = agent_id
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, agent_id: str) -> None:
+        with self._lock:
+            self._remove(agent_id)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._phones.clear()
+
+    def _remove(self, agent_id: str) -> None:
+        entry = self._entries.pop(agent_id, None)
+        if entry is None:
+            return
+        phone_number = entry[1].get("phone_number")
+        if phone_number and self._phones.get(phone_number) == agent_id:
+            del self._phones[phone_number]
+
+    async def watch(self, db) -> None:
+        with self._lock:
+            if self._watching:
+                return
+            self._watching = True
+
+        try:
+            while True:
+                try:
+                    async with db.agents.watch() as stream:
+                        logging.info("Watching agents collection for configuration changes")
+                        async for change in stream:
+                            document_key = change.get("documentKey") or {}
+                            if "_id" in document_key:
+                                self.invalidate(str(document_key["_id"]))
+                            else:
+                                self.clear()
+                except OperationFailure as e:
+                    logging.info(f"Agent change stream not available, relying on cache TTL: {str(e)}")
+                    return
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logging.error(f"Error watching agents collection: {str(e)}")
+                    self.clear()
+                    await asyncio.sleep(self.retry_delay)
+        finally:
+            with self._lock:
+                self._watching = False
+
+
+agent_cache = AgentCache()
@@ -1,13 +1,101 @@
 from motor.motor_asyncio import AsyncIOMotorClient
+from typing import Dict, Optional
+import asyncio
+import logging
 import os
+import threading
 from dotenv import load_dotenv
 
 load_dotenv()
 
+COLLECTIONS = (
+    "agents",
+    "sessions",
+    "session_archive",
+    "training_jobs",
+    "knowledge_manifests",
+    "processed_messages"
+)
+
 class Database:
+    _clients: Dict[Optional[asyncio.AbstractEventLoop], AsyncIOMotorClient] = {}
+    _client_pid = None
+    _instance = None
+    _lock = threading.RLock()
+
     def __init__(self):
-        mongodb_url = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
-        self.client = AsyncIOMotorClient(mongodb_url)
-        self.db = self.client[os.getenv("DATABASE_NAME", "agent_db")]
-        self.agents = self.db["agents"]
-        self.sessions = self.db["sessions"]
\ No newline at end of file
+        self.name = os.getenv("DATABASE_NAME", "agent_db")
+
+    def __getattr__(self, name: str):
+        if name in COLLECTIONS:
+            return self.db[name]
+        raise AttributeError(name)
+
+    @property
+    def client(self) -> AsyncIOMotorClient:
+        return self.get_client()
+
+    @property
+    def db(self):
+        return self.client[self.name]
+
+    @staticmethod
+    def _client_options() -> dict:
+        options = {
+            "maxPoolSize": int(os.getenv("MONGODB_MAX_POOL_SIZE", 100)),
+            "minPoolSize": int(os.getenv("MONGODB_MIN_POOL_SIZE", 0)),
+            "serverSelectionTimeoutMS": int(os.getenv("MONGODB_SERVER_SELECTION_TIMEOUT_MS", 30000)),
+            "connectTimeoutMS": int(os.getenv("MONGODB_CONNECT_TIMEOUT_MS", 20000))
+        }
+        if os.getenv("MONGODB_SOCKET_TIMEOUT_MS"):
+            options["socketTimeoutMS"] = int(os.getenv("MONGODB_SOCKET_TIMEOUT_MS"))
+        write_concern = os.getenv("MONGODB_WRITE_CONCERN")
+        if write_concern:
+            options["w"] = int(write_concern) if write_concern.isdigit() else write_concern
+        return options
+
+    @staticmethod
+    def _running_loop() -> Optional[asyncio.AbstractEventLoop]:
+        try:
+            return asyncio.get_running_loop()
+        except RuntimeError:
+            return None
+
+    @classmethod
+    def get_client(cls) -> AsyncIOMotorClient:
+        loop = cls._running_loop()
+        client = cls._clients.get(loop)
+        if client is not None and cls._client_pid == os.getpid():
+            return client
+
+        with cls._lock:
+            if cls._client_pid != os.getpid():
+                cls._clients = {}
+                cls._client_pid = os.getpid()
+            for stale_loop in [key for key in cls._clients if key is not None and key.is_closed()]:
+                cls._clients.pop(stale_loop).close()
+            client = cls._clients.get(loop)
+            if client is None:
+                mongodb_url = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
+                client = AsyncIOMotorClient(mongodb_url, **cls._client_options())
+                cls._clients[loop] = client
+                logging.info("MongoDB client created")
+            return client
+
+    @classmethod
+    def instance(cls) -> "Database":
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    @classmethod
+    def close(cls) -> None:
+        with cls._lock:
+            if cls._client_pid == os.getpid():
+                for client in cls._clients.values():
+                    client.close()
+                if cls._clients:
+                    logging.info(f"Closed {len(cls._clients)} MongoDB clients")
+            cls._clients = {}
+            cls._client_pid = None
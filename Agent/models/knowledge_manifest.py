@@ -0,0 +1,52 @@
+from pydantic import BaseModel, Field
+from typing import List, Optional
+from datetime import datetime, UTC
+from models.database import Database
+
+class ManifestShard(BaseModel):
+    bucket: int
+    content_hash: str
+    file_id: str
+    rows: int
+
+class ManifestSource(BaseModel):
+    key: str
+    kind: str
+    content_hash: str
+    shards: List[ManifestShard] = []
+    updated_at: datetime = Field(default_factory=lambda: datetime.now(UTC))
+
+class KnowledgeManifest(BaseModel):
+    agent_id: str
+    vector_store_id: Optional[str] = None
+    sources: List[ManifestSource] = []
+    updated_at: datetime = Field(default_factory=lambda: datetime.now(UTC))
+
+    class Config:
+        collection = "knowledge_manifests"
+
+    def source(self, key: str) -> Optional[ManifestSource]:
+        for source in self.sources:
+            if source.key == key:
+                return source
+        return None
+
+    def set_source(self, source: ManifestSource) -> None:
+        self.sources = [existing for existing in self.sources if existing.key != source.key] + [source]
+
+    def file_ids(self) -> List[str]:
+        return [shard.file_id for source in self.sources for shard in source.shards]
+
+    @classmethod
+    async def find(cls, db: Database, agent_id: str) -> Optional["KnowledgeManifest"]:
+        manifest_dict = await db.knowledge_manifests.find_one({"_id": agent_id})
+        return cls(**manifest_dict) if manifest_dict else None
+
+    @classmethod
+    async def save(cls, db: Database, manifest: "KnowledgeManifest") -> None:
+        manifest.updated_at = datetime.now(UTC)
+        await db.knowledge_manifests.replace_one(
+            {"_id": manifest.agent_id},
+            manifest.model_dump(),
+            upsert=True
+        )
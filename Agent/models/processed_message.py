@@ -0,0 +1,52 @@
+from datetime import datetime, timedelta, UTC
+from pymongo import ASCENDING
+from pymongo.errors import DuplicateKeyError
+from models.database import Database
+import os
+
+PROCESSED_MESSAGE_TTL = int(os.getenv("IDEMPOTENCY_TTL", 172800))
+
+class ProcessedMessage:
+    @classmethod
+    async def ensure_indexes(cls, db: Database) -> None:
+        await db.processed_messages.create_index(
+            [("created_at", ASCENDING)],
+            name="created_at_ttl",
+            expireAfterSeconds=PROCESSED_MESSAGE_TTL
+        )
+
+    @classmethod
+    async def claim(cls, db: Database, message_sid: str, claim_timeout: float) -> str:
+        now = datetime.now(UTC)
+        try:
+            await db.processed_messages.insert_one({
+                "_id": message_sid,
+                "status": "processing",
+                "claimed_at": now,
+                "created_at": now
+            })
+            return "claimed"
+        except DuplicateKeyError:
+            result = await db.processed_messages.update_one(
+                {
+                    "_id": message_sid,
+                    "status": "processing",
+                    "claimed_at": {"$lt": now - timedelta(seconds=claim_timeout)}
+                },
+                {"$set": {"claimed_at": now}}
+            )
+            if result.modified_count == 1:
+                return "claimed"
+            existing = await db.processed_messages.find_one({"_id": message_sid}, {"status": 1})
+            return existing["status"] if existing else "processing"
+
+    @classmethod
+    async def complete(cls, db: Database, message_sids: list) -> None:
+        await db.processed_messages.update_many(
+            {"_id": {"$in": message_sids}},
+            {"$set": {"status": "done", "completed_at": datetime.now(UTC)}}
+        )
+
+    @classmethod
+    async def release(cls, db: Database, message_sids: list) -> None:
+        await db.processed_messages.delete_many({"_id": {"$in": message_sids}, "status": "processing"})
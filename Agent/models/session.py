@@ -1,12 +1,15 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import List, Optional, Tuple
 from datetime import datetime, UTC
 from bson import ObjectId
+from pymongo import ASCENDING
 from models.database import Database
 
 class Message(BaseModel):
     role: str
     content: str
+    route: Optional[str] = None
+    route_source: Optional[str] = None
     timestamp: datetime = Field(default_factory=lambda: datetime.now(UTC))
 
 class Session(BaseModel):
@@ -15,12 +18,29 @@ class Session(BaseModel):
     conversation_id: str
     messages: List[Message]
     channel: Optional[str] = None
+    summary: Optional[str] = None
+    archived_count: int = 0
+    message_count: Optional[int] = None
     created_at: datetime = Field(default_factory=lambda: datetime.now(UTC))
     updated_at: datetime = Field(default_factory=lambda: datetime.now(UTC))
 
     class Config:
         collection = "sessions"
 
+    @classmethod
+    async def ensure_indexes(cls, db: Database) -> None:
+        await db.sessions.create_index(
+            [("agent_id", ASCENDING), ("conversation_id", ASCENDING)],
+            name="agent_conversation_unique",
+            unique=True
+        )
+
+    @staticmethod
+    def _conversation_filter(conversation_id: str, agent_id: Optional[str]) -> dict:
+        if agent_id is None:
+            return {"conversation_id": conversation_id}
+        return {"agent_id": agent_id, "conversation_id": conversation_id}
+
     @classmethod
     async def create(cls, db: Database, session_dict: dict) -> dict:
         result = await db.sessions.insert_one(session_dict)
@@ -28,12 +48,89 @@ class Session(BaseModel):
         return session_dict
 
     @classmethod
-    async def find_by_conversation_id(cls, db: Database, conversation_id: str) -> Optional[dict]:
-        session = await db.sessions.find_one({"conversation_id": conversation_id})
+    async def find_by_conversation_id(cls, db: Database, conversation_id: str, agent_id: Optional[str] = None) -> Optional[dict]:
+        session = await db.sessions.find_one(cls._conversation_filter(conversation_id, agent_id))
+        if session:
+            session["id"] = str(session["_id"])
+        return session
+
+    @classmethod
+    async def find_recent(cls, db: Database, conversation_id: str, limit: int, agent_id: Optional[str] = None) -> Optional[dict]:
+        session = await db.sessions.find_one(
+            cls._conversation_filter(conversation_id, agent_id),
+            {"messages": {"$slice": -limit}}
+        )
         if session:
             session["id"] = str(session["_id"])
         return session
 
+    @classmethod
+    def turn_operation(cls, agent_id: str, conversation_id: str, messages: List[dict], channel: Optional[str] = None) -> Tuple[dict, dict]:
+        now = datetime.now(UTC)
+        update = {
+            "$push": {"messages": {"$each": messages}},
+            "$set": {"updated_at": now},
+            "$setOnInsert": {"created_at": now},
+            "$inc": {"message_count": len(messages)}
+        }
+        if channel:
+            update["$set"]["channel"] = channel
+        return cls._conversation_filter(conversation_id, agent_id), update
+
+    @classmethod
+    async def commit_turn(cls, db: Database, agent_id: str, conversation_id: str, messages: List[dict], channel: Optional[str] = None) -> None:
+        query, update = cls.turn_operation(agent_id, conversation_id, messages, channel)
+        await db.sessions.update_one(query, update, upsert=True)
+
+    @classmethod
+    async def find_compaction_state(cls, db: Database, agent_id: str, conversation_id: str) -> Optional[dict]:
+        cursor = db.sessions.aggregate([
+            {"$match": cls._conversation_filter(conversation_id, agent_id)},
+            {"$project": {
+                "summary": 1,
+                "archived_count": {"$ifNull": ["$archived_count", 0]},
+                "live_count": {"$size": {"$ifNull": ["$messages", []]}}
+            }}
+        ])
+        states = await cursor.to_list(length=1)
+        return states[0] if states else None
+
+    @classmethod
+    async def find_oldest_messages(cls, db: Database, session_id: ObjectId, count: int) -> List[dict]:
+        session = await db.sessions.find_one(
+            {"_id": session_id},
+            {"messages": {"$slice": [0, count]}, "_id": 0}
+        )
+        return session.get("messages", []) if session else []
+
+    @classmethod
+    async def sync_message_count(cls, db: Database, session_id: ObjectId) -> None:
+        await db.sessions.update_one(
+            {"_id": session_id},
+            [{"$set": {"message_count": {"$size": {"$ifNull": ["$messages", []]}}}}]
+        )
+
+    @classmethod
+    async def apply_compaction(cls, db: Database, session_id: ObjectId, archived: int, summary: str, expected_archived_count: int) -> bool:
+        archived_filter = {"$in": [0, None]} if expected_archived_count == 0 else expected_archived_count
+        result = await db.sessions.update_one(
+            {"_id": session_id, "archived_count": archived_filter},
+            [
+                {"$set": {
+                    "messages": {"$slice": [
+                        "$messages",
+                        archived,
+                        {"$max": [{"$subtract": [{"$size": "$messages"}, archived]}, 1]}
+                    ]},
+                    "summary": {"$literal": summary},
+                    "archived_count": {"$add": [{"$ifNull": ["$archived_count", 0]}, archived]},
+                    "updated_at": datetime.now(UTC)
+                }},
+                {"$set": {"message_count": {"$size": "$messages"}}}
+            ]
+        )
+        return result.modified_count == 1
+
     @classmethod
     async def add_message(cls, db: Database, session_id: str, message: dict) -> None:
         await db.sessions.update_one(
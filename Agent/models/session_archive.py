@@ -0,0 +1,42 @@
+from pydantic import BaseModel, Field
+from typing import List
+from datetime import datetime, UTC
+from pymongo import ASCENDING, ReplaceOne
+from models.database import Database
+from models.session import Message
+
+class SessionArchive(BaseModel):
+    session_id: str
+    agent_id: str
+    conversation_id: str
+    start: int
+    messages: List[Message]
+    created_at: datetime = Field(default_factory=lambda: datetime.now(UTC))
+
+    class Config:
+        collection = "session_archive"
+
+    @classmethod
+    async def ensure_indexes(cls, db: Database) -> None:
+        await db.session_archive.create_index(
+            [("session_id", ASCENDING), ("start", ASCENDING)],
+            name="session_start"
+        )
+
+    @classmethod
+    async def save_buckets(cls, db: Database, buckets: List["SessionArchive"]) -> None:
+        if not buckets:
+            return
+        await db.session_archive.bulk_write([
+            ReplaceOne(
+                {"_id": f"{bucket.session_id}:{bucket.start}"},
+                bucket.model_dump(),
+                upsert=True
+            )
+            for bucket in buckets
+        ])
+
+    @classmethod
+    async def find_by_session(cls, db: Database, session_id: str) -> List[dict]:
+        cursor = db.session_archive.find({"session_id": session_id}).sort("start", ASCENDING)
+        return await cursor.to_list(length=None)
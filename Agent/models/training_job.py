@@ -0,0 +1,71 @@
+from pydantic import BaseModel, Field
+from typing import Any, Dict, Optional
+from datetime import datetime, UTC
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING
+from models.database import Database
+import socket
+
+ACTIVE_STATUSES = ["queued", "running"]
+
+class TrainingJob(BaseModel):
+    agent_id: str
+    kind: str
+    source: str
+    status: str = "queued"
+    stage: Optional[str] = None
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    owner: str = Field(default_factory=socket.gethostname)
+    created_at: datetime = Field(default_factory=lambda: datetime.now(UTC))
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        collection = "training_jobs"
+
+    @classmethod
+    async def ensure_indexes(cls, db: Database) -> None:
+        await db.training_jobs.create_index(
+            [("agent_id", ASCENDING), ("created_at", DESCENDING)],
+            name="agent_created_at"
+        )
+        await db.training_jobs.create_index(
+            [("owner", ASCENDING), ("status", ASCENDING)],
+            name="owner_status"
+        )
+
+    @classmethod
+    async def create(cls, db: Database, agent_id: str, kind: str, source: str) -> dict:
+        job_dict = cls(agent_id=agent_id, kind=kind, source=source).model_dump()
+        result = await db.training_jobs.insert_one(job_dict)
+        job_dict["_id"] = result.inserted_id
+        return job_dict
+
+    @classmethod
+    async def find(cls, db: Database, agent_id: str, job_id: str) -> Optional[dict]:
+        if not ObjectId.is_valid(job_id):
+            return None
+        return await db.training_jobs.find_one({"_id": ObjectId(job_id), "agent_id": agent_id})
+
+    @classmethod
+    async def update(cls, db: Database, job_id: ObjectId, update_data: dict) -> None:
+        await db.training_jobs.update_one({"_id": job_id}, {"$set": update_data})
+
+    @classmethod
+    async def mark_interrupted(cls, db: Database) -> int:
+        result = await db.training_jobs.update_many(
+            {"owner": socket.gethostname(), "status": {"$in": ACTIVE_STATUSES}},
+            {"$set": {
+                "status": "interrupted",
+                "error": "The service restarted before the job finished",
+                "finished_at": datetime.now(UTC)
+            }}
+        )
+        return result.modified_count
+
+    @staticmethod
+    def to_response(job_dict: dict) -> dict:
+        response = {key: value for key, value in job_dict.items() if key != "_id"}
+        response["job_id"] = str(job_dict["_id"])
+        return response
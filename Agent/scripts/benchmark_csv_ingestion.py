@@ -0,0 +1,63 @@
+from services.csv_ingestion import csv_to_hashed_shards
+import argparse
+import csv
+import io
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+MAKES = [("Toyota", "RAV4"), ("Nissan", "Versa"), ("Mazda", "CX-5"), ("Honda", "Civic"), ("Kia", "Rio")]
+
+
+def write_catalog(path: str, rows: int) -> None:
+    with open(path, "w", newline="", encoding="utf-8") as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(["make", "model", "version", "year", "price", "km"])
+        for index in range(rows):
+            make, model = MAKES[index % len(MAKES)]
+            writer.writerow([make, model, f"Versión {index % 7}", 2015 + index % 10, 150000 + index % 500000, index % 200000])
+
+
+def legacy_ingestion(csv_path: str, output_dir: str) -> None:
+    with open(csv_path, "rb") as csv_file:
+        csv_content = csv_file.read()
+    rows = list(csv.DictReader(io.StringIO(csv_content.decode("utf-8"))))
+    json_content = json.dumps(rows, ensure_ascii=False)
+    with open(os.path.join(output_dir, "catalog.json"), "w", encoding="utf-8") as json_file:
+        json_file.write(json_content)
+
+
+def streaming_ingestion(csv_path: str, output_dir: str) -> None:
+    csv_to_hashed_shards(csv_path, output_dir)
+
+
+def measure(ingestion, csv_path: str) -> tuple:
+    with tempfile.TemporaryDirectory() as output_dir:
+        tracemalloc.start()
+        start = time.perf_counter()
+        ingestion(csv_path, output_dir)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return elapsed, peak / (1024 * 1024)
+
+
+def run_benchmark(rows: int):
+    with tempfile.TemporaryDirectory() as work_dir:
+        csv_path = os.path.join(work_dir, "catalog.csv")
+        write_catalog(csv_path, rows)
+        size_mb = os.path.getsize(csv_path) / (1024 * 1024)
+        print(f"{rows} rows, {size_mb:.1f} MB CSV")
+        print(f"{'pipeline':>10} {'time (s)':>10} {'peak memory (MB)':>18}")
+        for name, ingestion in (("legacy", legacy_ingestion), ("streaming", streaming_ingestion)):
+            elapsed, peak_mb = measure(ingestion, csv_path)
+            print(f"{name:>10} {elapsed:>10.2f} {peak_mb:>18.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark full-copy and streaming CSV ingestion")
+    parser.add_argument("--rows", type=int, default=1000000)
+    args = parser.parse_args()
+    run_benchmark(args.rows)
@@ -0,0 +1,32 @@
+from services.financing_calculator import compute_financing_grid, financing_rows
+import argparse
+import time
+import numpy as np
+
+GRID_SIZES = [(10, 5, 4), (50, 9, 4), (250, 9, 4), (1000, 9, 4), (2500, 17, 4)]
+
+
+def time_call(function, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        function()
+    return (time.perf_counter() - start) / iterations * 1000
+
+
+def run_benchmark(iterations: int):
+    print(f"{'combinations':>13} {'grid (ms)':>11} {'grid + rows (ms)':>18}")
+    for price_count, percent_count, term_count in GRID_SIZES:
+        prices = np.linspace(150000, 900000, price_count)
+        percents = np.linspace(20, 60, percent_count)
+        terms = np.arange(3, 3 + term_count)
+
+        grid_ms = time_call(lambda: compute_financing_grid(prices, percents, terms), iterations)
+        rows_ms = time_call(lambda: financing_rows(compute_financing_grid(prices, percents, terms)), iterations)
+        print(f"{price_count * percent_count * term_count:>13} {grid_ms:>11.3f} {rows_ms:>18.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the vectorized financing calculator")
+    parser.add_argument("--iterations", type=int, default=100)
+    args = parser.parse_args()
+    run_benchmark(args.iterations)
@@ -0,0 +1,66 @@
+from models.database import Database
+from models.session import Session
+from datetime import datetime, UTC
+import argparse
+import asyncio
+import time
+
+SESSION_SIZES = [10, 100, 1000, 5000, 20000]
+
+
+def build_session(conversation_id: str, size: int) -> dict:
+    return {
+        "agent_id": "benchmark",
+        "conversation_id": conversation_id,
+        "channel": "whatsapp",
+        "messages": [
+            {
+                "role": "user" if index % 2 == 0 else "assistant",
+                "content": f"Mensaje de prueba número {index} sobre autos seminuevos y financiamiento",
+                "timestamp": datetime.now(UTC)
+            }
+            for index in range(size)
+        ],
+        "created_at": datetime.now(UTC),
+        "updated_at": datetime.now(UTC)
+    }
+
+
+async def time_loader(loader, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        session_data = await loader()
+        Session(**session_data).messages[-6:]
+    return (time.perf_counter() - start) / iterations * 1000
+
+
+async def run_benchmark(iterations: int, history_messages: int):
+    db = Database()
+    db.sessions = db.db["sessions_benchmark"]
+    await db.sessions.delete_many({})
+
+    print(f"{'messages':>10} {'full load (ms)':>16} {'$slice load (ms)':>18}")
+    try:
+        for size in SESSION_SIZES:
+            conversation_id = f"benchmark-{size}"
+            await db.sessions.insert_one(build_session(conversation_id, size))
+
+            full_ms = await time_loader(
+                lambda: Session.find_by_conversation_id(db, conversation_id),
+                iterations
+            )
+            slice_ms = await time_loader(
+                lambda: Session.find_recent(db, conversation_id, history_messages),
+                iterations
+            )
+            print(f"{size:>10} {full_ms:>16.2f} {slice_ms:>18.2f}")
+    finally:
+        await db.sessions.drop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare full session loading against $slice history loading")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--history-messages", type=int, default=6)
+    args = parser.parse_args()
+    asyncio.run(run_benchmark(args.iterations, args.history_messages))
@@ -5,7 +5,7 @@ import logging
 import asyncio
 
 async def init_default_agent():
-    db = Database()
+    db = Database.instance()
     
     existing_agent = await Agent.find_by_phone(db, "14155238886")
     if existing_agent:
@@ -28,9 +28,9 @@ async def init_default_agent():
         ),
         instructions="""Calculate car financing plans by: 
 1) Get car price, down payment % (min 20%), and term (3-6 years). 
-2) Calculate: down payment (price * %), amount to finance (price - down payment), 
-   monthly payment using 10% annual interest, total payment (monthly * term months), 
-   total interest (total - financed). 
+2) Use the financing tools to get the down payment, amount to finance, 
+   monthly payment using 10% annual interest, total payment and total interest. 
+   Never do the arithmetic yourself. 
 3) Present: down payment, financed amount, monthly payment, total payment, 
    total interest, term. 
 4) If requested, show alternatives with different down payments, terms, or prices. 
@@ -0,0 +1,37 @@
+from models.agent import Agent
+from models.session import Session
+from models.session_archive import SessionArchive
+from models.training_job import TrainingJob
+from models.processed_message import ProcessedMessage
+from models.database import Database
+import logging
+import asyncio
+
+async def init_indexes() -> dict:
+    db = Database.instance()
+
+    try:
+        await Agent.ensure_indexes(db)
+        await Session.ensure_indexes(db)
+        await SessionArchive.ensure_indexes(db)
+        await TrainingJob.ensure_indexes(db)
+        await ProcessedMessage.ensure_indexes(db)
+    except Exception as e:
+        logging.error(f"Error creating indexes: {str(e)}")
+        raise
+
+    report = {
+        "agents": await db.agents.index_information(),
+        "sessions": await db.sessions.index_information(),
+        "session_archive": await db.session_archive.index_information(),
+        "training_jobs": await db.training_jobs.index_information(),
+        "processed_messages": await db.processed_messages.index_information()
+    }
+    for collection, indexes in report.items():
+        for name, info in indexes.items():
+            logging.info(f"Index {collection}.{name}: {info['key']}{' (unique)' if info.get('unique') else ''}")
+    return report
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(init_indexes())
@@ -0,0 +1,75 @@
+from services.queue_shards import queue_shards, shard_queue_names
+from services.retry_topology import RETRY_COUNT_HEADER, dead_letter_queue_name
+from dotenv import load_dotenv
+import amqpstorm
+import argparse
+import os
+
+load_dotenv()
+
+REPLAY_DROPPED_HEADERS = (RETRY_COUNT_HEADER, "x-last-error", "x-original-queue", "x-failed-at")
+
+
+def replay(queue: str, limit: int, dry_run: bool) -> int:
+    connection = amqpstorm.Connection(
+        hostname=os.getenv('RABBITMQ_HOST', 'localhost'),
+        port=int(os.getenv('RABBITMQ_PORT', 5672)),
+        username=os.getenv('RABBITMQ_USER', 'guest'),
+        password=os.getenv('RABBITMQ_PASSWORD', 'guest')
+    )
+    channel = connection.channel()
+    channel.confirm_deliveries()
+    dead_letter_queue = dead_letter_queue_name(queue)
+    replayed = 0
+
+    try:
+        while limit <= 0 or replayed < limit:
+            message = channel.basic.get(queue=dead_letter_queue, no_ack=False)
+            if message is None:
+                break
+
+            headers = dict(message.properties.get("headers") or {})
+            target = headers.get("x-original-queue") or queue
+            print(f"{target}: {headers.get('x-last-error', '')} {message.body[:200]}")
+
+            if dry_run:
+                replayed += 1
+                continue
+
+            for header in REPLAY_DROPPED_HEADERS:
+                headers.pop(header, None)
+            published = channel.basic.publish(
+                body=message.body,
+                routing_key=target,
+                properties={
+                    "delivery_mode": 2,
+                    "headers": headers
+                }
+            )
+            if not published:
+                message.reject(requeue=True)
+                raise RuntimeError("The broker did not confirm the replayed message")
+            message.ack()
+            replayed += 1
+    finally:
+        channel.close()
+        connection.close()
+
+    return replayed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move dead-lettered messages back to their queue")
+    parser.add_argument("--queue", default=os.getenv('RABBITMQ_INPUT_QUEUE', 'agent_input_queue'),
+                        help="Main queue whose dead-letter queues are replayed, one per AGENT_QUEUE_SHARDS shard")
+    parser.add_argument("--limit", type=int, default=0, help="Maximum number of messages to replay (0 for all)")
+    parser.add_argument("--dry-run", action="store_true", help="List the messages without replaying them")
+    args = parser.parse_args()
+
+    total = 0
+    for queue in shard_queue_names(args.queue, queue_shards()):
+        if args.limit > 0 and total >= args.limit:
+            break
+        count = replay(queue, args.limit - total if args.limit > 0 else 0, args.dry_run)
+        total += count
+        print(f"{'Listed' if args.dry_run else 'Replayed'} {count} messages from {dead_letter_queue_name(queue)}")
@@ -0,0 +1,61 @@
+from models.database import Database
+from services.router import NaiveBayesRouter, ROUTES
+import argparse
+import asyncio
+import logging
+import os
+import random
+
+async def load_samples(db: Database) -> list:
+    samples = []
+    for collection in (db.sessions, db.session_archive):
+        cursor = collection.aggregate([
+            {"$unwind": "$messages"},
+            {"$match": {
+                "messages.role": "user",
+                "messages.route": {"$in": list(ROUTES)},
+                "messages.route_source": "orchestrator"
+            }},
+            {"$project": {"_id": 0, "content": "$messages.content", "route": "$messages.route"}}
+        ])
+        async for sample in cursor:
+            samples.append((sample["content"], sample["route"]))
+    return samples
+
+def evaluate(train: list, holdout: list, threshold: float) -> None:
+    router = NaiveBayesRouter(NaiveBayesRouter.train(train))
+    confident = correct = 0
+    for message, route in holdout:
+        decision = router.route(message)
+        if decision and decision.confidence >= threshold:
+            confident += 1
+            correct += 1 if decision.route == route else 0
+    coverage = confident / len(holdout) if holdout else 0
+    precision = correct / confident if confident else 0
+    logging.info(f"Holdout: {len(holdout)} samples, coverage {coverage:.1%}, precision {precision:.1%} at threshold {threshold}")
+
+async def train_router(output: str, threshold: float, holdout_ratio: float) -> None:
+    samples = await load_samples(Database.instance())
+    if not samples:
+        logging.error("No user messages routed by the orchestrator found in sessions, nothing to train")
+        return
+
+    for route in ROUTES:
+        logging.info(f"{route}: {sum(1 for _, label in samples if label == route)} samples")
+
+    random.shuffle(samples)
+    split = int(len(samples) * (1 - holdout_ratio))
+    if 0 < split < len(samples):
+        evaluate(samples[:split], samples[split:], threshold)
+
+    NaiveBayesRouter.save(NaiveBayesRouter.train(samples), output)
+    logging.info(f"Router model trained on {len(samples)} samples and saved to {output}")
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Train the local pre-router classifier from logged sessions")
+    parser.add_argument("--output", default=os.getenv("ROUTER_MODEL_PATH", "data/router_model.json"))
+    parser.add_argument("--threshold", type=float, default=float(os.getenv("ROUTER_CONFIDENCE_THRESHOLD", 0.85)))
+    parser.add_argument("--holdout", type=float, default=0.2)
+    args = parser.parse_args()
+    asyncio.run(train_router(args.output, args.threshold, args.holdout))
@@ -1,36 +1,99 @@
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple, List, AsyncIterator, Awaitable, Callable
+from dataclasses import dataclass, field
 from models.agent import Agent, KnowledgeBase
 from models.database import Database
 from models.session import Session, Message
-from openai import OpenAI
+from openai import AsyncOpenAI
 from bson import ObjectId
 import os
 from dotenv import load_dotenv
 import tempfile
 import logging
 import time
-import csv
-import io
+import hashlib
+from agents import Runner, Agent as OpenAIAgent, FileSearchTool, RunContextWrapper, ItemHelpers, ToolCallItem, function_tool
+from openai.types.responses import ResponseTextDeltaEvent
+import httpx
+import asyncio
 from pathlib import Path
-from agents import Runner, Agent as OpenAIAgent, FileSearchTool
-import requests
-import json
+from services.prompt_registry import prompt_registry
+from services.session_write_buffer import SessionWriteBuffer
+from services.session_compactor import SessionCompactor
+from services.router import build_pre_router, KeywordRouter
+from services.response_cache import response_cache
+from services.language import is_spanish
+from services.metrics import metrics
+from services.financing_calculator import financing_tools
+from services.catalog_index import catalog_indexes, create_catalog_search_tool
+from services.csv_ingestion import ShardFile, csv_to_hashed_shards, file_hash
+from services.knowledge_sync import KnowledgeSync
+from services.web_ingestion import WebIngestion, dedupe_pages, pack_pages, pages_hash
 
 load_dotenv()
 
+TOOL_ROUTES = {
+    "support_info": "support",
+    "catalog_info": "catalog",
+    "financing_info": "financing"
+}
+
+@dataclass
+class TurnContext:
+    history_text: str
+    user_message: str
+    history_items: List[Dict[str, str]] = field(default_factory=list)
+
+@dataclass
+class AgentGraph:
+    support: OpenAIAgent
+    catalog: OpenAIAgent
+    financing: OpenAIAgent
+    orchestrator: OpenAIAgent
+    translator: OpenAIAgent
+
+@dataclass
+class ChatTurn:
+    session: Session
+    agent_data: Agent
+    graph: AgentGraph
+    context: TurnContext
+    user_message: Message
+    channel: Optional[str]
+    channel_update: Optional[str]
+    cache_version: Optional[str] = None
+    started_at: float = field(default_factory=time.perf_counter)
+
 class AgentService:
     def __init__(self):
-        self.db = Database()
-        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        self.db = Database.instance()
+        self.client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        self.prompts = prompt_registry
+        self._graphs: Dict[str, Tuple[str, AgentGraph]] = {}
+        self.history_mode = os.getenv("AGENT_HISTORY_MODE", "instructions").lower()
+        self.history_messages = int(os.getenv("AGENT_HISTORY_MESSAGES", 6))
+        self.compactor = SessionCompactor(self.db)
+        self.pre_router = build_pre_router()
+        self.translator_mode = os.getenv("AGENT_TRANSLATOR_MODE", "always").lower()
+        self.response_cache = response_cache if os.getenv("RESPONSE_CACHE", "false").lower() == "true" else None
+        self.faq_router = KeywordRouter()
+        self.write_buffer = (
+            SessionWriteBuffer(self.db)
+            if os.getenv("SESSION_WRITE_BEHIND", "false").lower() == "true"
+            else None
+        )
         self.process_prompt = self._load_prompt_file("process_content")
         self.agent_prompt = self._load_prompt_file("agent")
         self.jina_api_key = os.getenv("JINA_API_KEY")
+        self.jina_timeout = float(os.getenv("JINA_TIMEOUT", 60))
+        self.web_ingestion = WebIngestion()
+        self.knowledge_sync = KnowledgeSync(
+            self.client,
+            self.db,
+            max(1, int(os.getenv("TRAINING_UPLOAD_CONCURRENCY", 4)))
+        )
 
     def _load_prompt_file(self, prompt_name: str) -> str:
-        prompt_path = Path(f"prompts/{prompt_name}.txt")
-        if not prompt_path.exists():
-            raise Exception(f"Prompt file not found. Please ensure 'prompts/{prompt_name}.txt' exists.")
-        return prompt_path.read_text(encoding='utf-8')
+        return self.prompts.get(prompt_name)
 
     def _format_agent_instructions(self, agent_data: Agent) -> str:
         return self.agent_prompt.format(
@@ -42,10 +105,27 @@ class AgentService:
         )
 
     def _format_prompt(self, prompt_name: str, agent_data: Agent) -> str:
-        prompt_path = Path(f"prompts/{prompt_name}.txt")
-        if not prompt_path.exists():
-            raise Exception(f"Prompt file not found. Please ensure 'prompts/{prompt_name}.txt' exists.")
-        return prompt_path.read_text(encoding='utf-8')
+        return self.prompts.render(
+            self.prompts.get(prompt_name),
+            name=agent_data.name,
+            brand=agent_data.brand,
+            description=agent_data.description,
+            tone=agent_data.tone or "Professional, friendly, and helpful"
+        )
+
+    def _answer_prompt(self, prompt_name: str, agent_data: Agent) -> str:
+        prompt_content = self._format_prompt(prompt_name, agent_data)
+        if self.translator_mode == "fallback":
+            prompt_content = f"{prompt_content}\n\n{self._format_prompt('brand_voice', agent_data)}"
+        return prompt_content
+
+    def _with_history(self, prompt_content: str):
+        if self.history_mode == "input":
+            return prompt_content
+
+        def instructions(context: RunContextWrapper[TurnContext], agent: OpenAIAgent) -> str:
+            return f"{prompt_content}\n\nConversation Context:\n{context.context.history_text}"
+        return instructions
 
     async def create_agent(self, agent: Agent) -> Agent:
         agent_dict = agent.model_dump()
@@ -53,12 +133,12 @@ class AgentService:
         return Agent(**created_agent)
 
     async def get_agent(self, agent_id: str) -> Optional[Agent]:
-        agent_data = await Agent.find_by_id(self.db, agent_id)
+        agent_data = await Agent.get_cached(self.db, agent_id)
         if agent_data:
             return Agent(**agent_data)
         return None
 
-    def _create_support_agent(self, agent_data: Agent, history_text: str) -> OpenAIAgent:
+    def _create_support_agent(self, agent_data: Agent) -> OpenAIAgent:
         tools = []
         if agent_data.knowledgeBase and agent_data.knowledgeBase.file_ids:
             tools.append(
@@ -69,8 +149,7 @@ class AgentService:
                 )
             )
         
-        prompt_content = self._format_prompt("support_agent", agent_data)
-        instructions = f"{prompt_content}\n\nConversation Context:\n{history_text}"
+        instructions = self._with_history(self._answer_prompt("support_agent", agent_data))
         
         return OpenAIAgent(
             name=f"{agent_data.name}_support",
@@ -78,8 +157,10 @@ class AgentService:
             tools=tools
         )
 
-    def _create_catalog_agent(self, agent_data: Agent, history_text: str) -> OpenAIAgent:
+    def _create_catalog_agent(self, agent_data: Agent, agent_id: str) -> OpenAIAgent:
         tools = []
+        if catalog_indexes.exists(agent_id):
+            tools.append(create_catalog_search_tool(agent_id))
         if agent_data.knowledgeBase and agent_data.knowledgeBase.file_ids:
             tools.append(
                 FileSearchTool(
@@ -89,8 +170,7 @@ class AgentService:
                 )
             )
         
-        prompt_content = self._format_prompt("catalog_agent", agent_data)
-        instructions = f"{prompt_content}\n\nConversation Context:\n{history_text}"
+        instructions = self._with_history(self._answer_prompt("catalog_agent", agent_data))
         
         return OpenAIAgent(
             name=f"{agent_data.name}_catalog",
@@ -98,200 +178,435 @@ class AgentService:
             tools=tools
         )
 
-    def _create_financing_agent(self, agent_data: Agent, history_text: str) -> OpenAIAgent:
-        prompt_content = self._format_prompt("financing_agent", agent_data)
-        instructions = f"{prompt_content}\n\nConversation Context:\n{history_text}"
+    def _create_financing_agent(self, agent_data: Agent) -> OpenAIAgent:
+        instructions = self._with_history(self._answer_prompt("financing_agent", agent_data))
         
         return OpenAIAgent(
             name=f"{agent_data.name}_financing",
-            instructions=instructions
+            instructions=instructions,
+            tools=financing_tools
         )
 
     def _create_translator_agent(self, agent_data: Agent) -> OpenAIAgent:
+        prompt_content = self._format_prompt("translator_agent", agent_data)
+
+        if self.history_mode == "input":
+            return OpenAIAgent(
+                name=f"{agent_data.name}_translator",
+                instructions=self.prompts.render(
+                    prompt_content,
+                    history_text="Provided as the previous messages of this conversation.",
+                    user_message="Provided as the last user message of this conversation."
+                )
+            )
+
+        def instructions(context: RunContextWrapper[TurnContext], agent: OpenAIAgent) -> str:
+            return self.prompts.render(
+                prompt_content,
+                history_text=context.context.history_text,
+                user_message=context.context.user_message
+            )
+
         return OpenAIAgent(
             name=f"{agent_data.name}_translator",
-            instructions=self._format_prompt("translator_agent", agent_data)
+            instructions=instructions
+        )
+
+    def _as_tool(self, agent: OpenAIAgent, tool_name: str, tool_description: str):
+        if self.history_mode != "input":
+            return agent.as_tool(tool_name=tool_name, tool_description=tool_description)
+
+        @function_tool(name_override=tool_name, description_override=tool_description)
+        async def run_agent(context: RunContextWrapper[TurnContext], input: str) -> str:
+            result = await Runner.run(
+                agent,
+                self._conversation_input(context.context, input),
+                context=context.context
+            )
+            return ItemHelpers.text_message_outputs(result.new_items)
+
+        return run_agent
+
+    def _conversation_input(self, turn_context: TurnContext, *messages: str):
+        if self.history_mode != "input":
+            return messages[-1]
+        return turn_context.history_items + [{"role": "user", "content": content} for content in messages]
+
+    def _log_usage(self, stage: str, result) -> None:
+        input_tokens = sum(response.usage.input_tokens for response in result.raw_responses)
+        output_tokens = sum(response.usage.output_tokens for response in result.raw_responses)
+        logging.info(
+            f"{stage} usage (history mode: {self.history_mode}): "
+            f"{input_tokens} input tokens, {output_tokens} output tokens"
         )
 
     def _create_orchestrator_agent(self, agent_data: Agent, support_agent: OpenAIAgent, 
                                  catalog_agent: OpenAIAgent, financing_agent: OpenAIAgent) -> OpenAIAgent:
         return OpenAIAgent(
             name=f"{agent_data.name}_orchestrator",
-            instructions=self._format_prompt("orchestrator_agent", agent_data),
+            instructions=self._answer_prompt("orchestrator_agent", agent_data),
             tools=[
-                support_agent.as_tool(
+                self._as_tool(
+                    support_agent,
                     tool_name="support_info",
                     tool_description="Get general information about the company and its services"
                 ),
-                catalog_agent.as_tool(
+                self._as_tool(
+                    catalog_agent,
                     tool_name="catalog_info",
                     tool_description="Get information about available cars in the catalog"
                 ),
-                financing_agent.as_tool(
+                self._as_tool(
+                    financing_agent,
                     tool_name="financing_info",
                     tool_description="Calculate and provide information about financing plans"
                 )
             ]
         )
 
-    async def chat(self, agent_id: str, conversation_id: str, message: str, channel: str = None) -> dict:
-        try:
-            session_data = await Session.find_by_conversation_id(self.db, conversation_id)
-            if not session_data:
-                session = Session(
-                    agent_id=agent_id,
-                    conversation_id=conversation_id,
-                    messages=[],
-                    channel=channel
-                )
-                session_dict = session.model_dump()
-                created_session = await Session.create(self.db, session_dict)
-                session = Session(**created_session)
-            else:
-                session = Session(**session_data)
-                if channel and not session.channel:
-                    await Session.update(
-                        self.db,
-                        str(session.id),
-                        {"channel": channel}
-                    )
-            
-            agent_data = await self.get_agent(agent_id)
-            if not agent_data:
-                raise Exception("Agent not found")
-
-            try:
-                conversation_history = session.messages[-6:] if session.messages else []
-                history_text = "\n".join([f"{msg.role}: {msg.content}" for msg in conversation_history])
-                logging.info(f"Conversation history obtained: {len(conversation_history)} messages")
-            except Exception as e:
-                logging.error(f"Error obtaining conversation history: {str(e)}")
-                history_text = "No previous conversation history"
-
-            support_agent = self._create_support_agent(agent_data, history_text)
-            catalog_agent = self._create_catalog_agent(agent_data, history_text)
-            financing_agent = self._create_financing_agent(agent_data, history_text)
-            
-            try:
-                prompt_content = self._format_prompt("translator_agent", agent_data)
-                translator_prompt = prompt_content.format(
-                    brand=agent_data.brand,
-                    description=agent_data.description,
-                    tone=agent_data.tone or "Professional, friendly, and helpful",
-                    history_text=history_text,
-                    user_message=message
-                )
-                logging.info("Translator prompt formatted correctly")
-            except Exception as e:
-                logging.error(f"Error formatting translator prompt: {str(e)}")
-                raise Exception(f"Error formatting translator prompt: {str(e)}")
-            
-            translator_agent = self._create_translator_agent(agent_data)
-            translator_agent.instructions = translator_prompt
-            
-            orchestrator_agent = self._create_orchestrator_agent(
-                agent_data, 
-                support_agent, 
-                catalog_agent, 
+    def _agent_version(self, agent_id: str, agent_data: Agent) -> str:
+        agent_fingerprint = hashlib.sha1(
+            agent_data.model_dump_json(exclude={"created_at"}).encode("utf-8")
+        ).hexdigest()
+        return f"{agent_fingerprint}:{self.prompts.version}:{catalog_indexes.exists(agent_id)}"
+
+    def _build_agent_graph(self, agent_id: str, agent_data: Agent) -> AgentGraph:
+        support_agent = self._create_support_agent(agent_data)
+        catalog_agent = self._create_catalog_agent(agent_data, agent_id)
+        financing_agent = self._create_financing_agent(agent_data)
+        return AgentGraph(
+            support=support_agent,
+            catalog=catalog_agent,
+            financing=financing_agent,
+            orchestrator=self._create_orchestrator_agent(
+                agent_data,
+                support_agent,
+                catalog_agent,
                 financing_agent
-            )
+            ),
+            translator=self._create_translator_agent(agent_data)
+        )
 
-            formatted_instructions = self._format_agent_instructions(agent_data)
-            if history_text:
-                formatted_instructions += f"\n\nConversation history:\n{history_text}"
+    def _get_agent_graph(self, agent_id: str, agent_data: Agent) -> AgentGraph:
+        version = self._agent_version(agent_id, agent_data)
+        cached = self._graphs.get(agent_id)
+        if cached and cached[0] == version:
+            return cached[1]
+
+        graph = self._build_agent_graph(agent_id, agent_data)
+        self._graphs[agent_id] = (version, graph)
+        logging.info(f"Agent graph built for agent {agent_id}")
+        return graph
+
+    def invalidate_agent(self, agent_id: str) -> None:
+        self._graphs.pop(agent_id, None)
+        if self.response_cache:
+            self.response_cache.invalidate(agent_id)
+
+    def _is_history_independent(self, message: str) -> bool:
+        decision = self.faq_router.route(message)
+        return bool(decision and decision.route == "support" and decision.confidence >= 0.9)
+
+    def _cached_answer(self, turn: ChatTurn) -> Optional[str]:
+        if turn.cache_version is None:
+            return None
+
+        entry = self.response_cache.lookup(turn.session.agent_id, turn.cache_version, turn.context.user_message)
+        if entry is None:
+            metrics.increment("response_cache_misses_total")
+            return None
+
+        metrics.increment("response_cache_hits_total")
+        metrics.increment("response_cache_saved_ms_total", entry.latency_ms)
+        logging.info(f"Response cache hit for agent {turn.session.agent_id}")
+        turn.user_message.route = "support"
+        turn.user_message.route_source = "cache"
+        return entry.response
+
+    def _remember_answer(self, turn: ChatTurn, answer: str) -> None:
+        if turn.cache_version is None or turn.user_message.route != "support":
+            return
+        if turn.context.history_items:
+            return
+        self.response_cache.store(
+            turn.session.agent_id,
+            turn.cache_version,
+            turn.context.user_message,
+            answer,
+            (time.perf_counter() - turn.started_at) * 1000
+        )
 
-            user_message = Message(role="user", content=message)
-            await Session.add_message(self.db, str(session.id), user_message.model_dump())
+    def _route_from_result(self, result) -> Optional[str]:
+        for item in result.new_items:
+            if isinstance(item, ToolCallItem):
+                route = TOOL_ROUTES.get(getattr(item.raw_item, "name", None))
+                if route:
+                    return route
+        return None
 
-            orchestrator_result = await Runner.run(orchestrator_agent, message)
-            
-            translator_result = await Runner.run(
-                translator_agent,
-                f"Translate the following response to Spanish and format it as if you were an employee of {agent_data.brand}:\n\n{orchestrator_result.final_output}"
+    async def _run_router_stage(self, graph: AgentGraph, turn_context: TurnContext, message: str) -> Tuple[Any, Optional[str], str]:
+        decision = self.pre_router.route(message) if self.pre_router else None
+        if decision:
+            logging.info(
+                f"Pre-router dispatched message to {decision.route} agent "
+                f"({decision.source}, confidence {decision.confidence:.2f})"
             )
-            
-            assistant_message = translator_result.final_output
+            result = await Runner.run(
+                getattr(graph, decision.route),
+                self._conversation_input(turn_context, message),
+                context=turn_context
+            )
+            self._log_usage(f"Pre-routed {decision.route}", result)
+            return result, decision.route, decision.source
+
+        result = await Runner.run(
+            graph.orchestrator,
+            self._conversation_input(turn_context, message),
+            context=turn_context
+        )
+        self._log_usage("Orchestrator", result)
+        return result, self._route_from_result(result), "orchestrator"
+
+    def _needs_translation(self, answer: str) -> bool:
+        if self.translator_mode != "fallback":
+            return True
+        if is_spanish(answer):
+            metrics.increment("translator_skipped_total")
+            return False
+        metrics.increment("translator_fallback_total")
+        logging.info("Answer is not in Spanish, running translator fallback")
+        return True
+
+    def _translator_input(self, turn: ChatTurn, answer: str):
+        translation_request = f"Translate the following response to Spanish and format it as if you were an employee of {turn.agent_data.brand}:\n\n{answer}"
+        return self._conversation_input(turn.context, turn.context.user_message, translation_request)
+
+    async def _run_translator_stage(self, turn: ChatTurn, answer: str) -> str:
+        if not self._needs_translation(answer):
+            return answer
+
+        translator_result = await Runner.run(
+            turn.graph.translator,
+            self._translator_input(turn, answer),
+            context=turn.context
+        )
+        metrics.increment("translator_runs_total")
+        self._log_usage("Translator", translator_result)
+        return translator_result.final_output
+
+    async def _commit_turn(self, agent_id: str, conversation_id: str, messages: list, channel: Optional[str]) -> None:
+        if self.write_buffer:
+            await self.write_buffer.commit(agent_id, conversation_id, messages, channel)
+        else:
+            await Session.commit_turn(self.db, agent_id, conversation_id, messages, channel)
+
+    async def _prepare_turn(self, agent_id: str, conversation_id: str, message: str, channel: Optional[str]) -> ChatTurn:
+        session_data = await Session.find_recent(
+            self.db,
+            conversation_id,
+            self.history_messages,
+            agent_id=agent_id
+        )
+        if session_data:
+            session = Session(**session_data)
+        else:
+            session = Session(
+                agent_id=agent_id,
+                conversation_id=conversation_id,
+                messages=[],
+                channel=channel,
+                message_count=0
+            )
+        channel_update = channel if channel and not (session_data and session.channel) else None
+        
+        agent_data = await self.get_agent(agent_id)
+        if not agent_data:
+            raise Exception("Agent not found")
 
-            agent_message = Message(role="assistant", content=assistant_message)
-            await Session.add_message(self.db, str(session.id), agent_message.model_dump())
+        try:
+            conversation_history = session.messages
+            history_text = "\n".join([f"{msg.role}: {msg.content}" for msg in conversation_history])
+            history_items = [{"role": msg.role, "content": msg.content} for msg in conversation_history]
+            if session.summary:
+                summary_text = f"Summary of earlier conversation:\n{session.summary}"
+                history_text = f"{summary_text}\n\n{history_text}"
+                history_items = [{"role": "system", "content": summary_text}] + history_items
+            logging.info(f"Conversation history obtained: {len(conversation_history)} messages")
+        except Exception as e:
+            logging.error(f"Error obtaining conversation history: {str(e)}")
+            history_text = "No previous conversation history"
+            history_items = []
+
+        return ChatTurn(
+            session=session,
+            agent_data=agent_data,
+            graph=self._get_agent_graph(agent_id, agent_data),
+            context=TurnContext(
+                history_text=history_text,
+                user_message=message,
+                history_items=history_items
+            ),
+            user_message=Message(role="user", content=message),
+            channel=session.channel or channel,
+            channel_update=channel_update,
+            cache_version=(
+                self._agent_version(agent_id, agent_data)
+                if self.response_cache and self._is_history_independent(message)
+                else None
+            )
+        )
 
-            return {
-                "message": assistant_message,
-                "conversation_id": conversation_id,
-                "channel": session.channel
-            }
+    async def _finish_turn(self, turn: ChatTurn, assistant_message: str) -> dict:
+        agent_message = Message(role="assistant", content=assistant_message)
+        await self._commit_turn(
+            turn.session.agent_id,
+            turn.session.conversation_id,
+            [turn.user_message.model_dump(), agent_message.model_dump()],
+            turn.channel_update
+        )
+        self.compactor.maybe_schedule(turn.session, added=2)
+
+        return {
+            "message": assistant_message,
+            "conversation_id": turn.session.conversation_id,
+            "channel": turn.channel
+        }
+
+    async def chat(self, agent_id: str, conversation_id: str, message: str, channel: str = None) -> dict:
+        try:
+            turn = await self._prepare_turn(agent_id, conversation_id, message, channel)
+
+            assistant_message = self._cached_answer(turn)
+            if assistant_message is None:
+                orchestrator_result, turn.user_message.route, turn.user_message.route_source = await self._run_router_stage(turn.graph, turn.context, message)
+                
+                assistant_message = await self._run_translator_stage(turn, orchestrator_result.final_output)
+                self._remember_answer(turn, assistant_message)
+
+            return await self._finish_turn(turn, assistant_message)
 
         except Exception as e:
             logging.error(f"Error in chat: {str(e)}")
             logging.error(f"Error details:", exc_info=True)
             raise Exception(f"Error in chat: {str(e)}")
 
-    def _csv_to_json(self, csv_content: bytes) -> str:
+    async def chat_stream(self, agent_id: str, conversation_id: str, message: str, channel: str = None) -> AsyncIterator[dict]:
         try:
-            csv_text = csv_content.decode('utf-8')
-            csv_reader = csv.DictReader(io.StringIO(csv_text))
-            rows = list(csv_reader)
-            return json.dumps(rows, ensure_ascii=False)
+            turn = await self._prepare_turn(agent_id, conversation_id, message, channel)
+
+            cached_message = self._cached_answer(turn)
+            if cached_message is not None:
+                yield {"type": "delta", "delta": cached_message}
+                yield {"type": "done", **await self._finish_turn(turn, cached_message)}
+                return
+
+            orchestrator_result, turn.user_message.route, turn.user_message.route_source = await self._run_router_stage(turn.graph, turn.context, message)
+            assistant_message = orchestrator_result.final_output
+
+            if self._needs_translation(assistant_message):
+                translator_result = Runner.run_streamed(
+                    turn.graph.translator,
+                    self._translator_input(turn, assistant_message),
+                    context=turn.context
+                )
+                async for event in translator_result.stream_events():
+                    if event.type == "raw_response_event" and isinstance(event.data, ResponseTextDeltaEvent):
+                        yield {"type": "delta", "delta": event.data.delta}
+                metrics.increment("translator_runs_total")
+                self._log_usage("Translator", translator_result)
+                assistant_message = translator_result.final_output
+            else:
+                yield {"type": "delta", "delta": assistant_message}
+
+            self._remember_answer(turn, assistant_message)
+            yield {"type": "done", **await self._finish_turn(turn, assistant_message)}
+
         except Exception as e:
-            raise Exception(f"Error converting CSV to JSON: {str(e)}")
+            logging.error(f"Error in chat stream: {str(e)}")
+            logging.error("Error details:", exc_info=True)
+            yield {"type": "error", "detail": f"Error in chat: {str(e)}"}
+
+    async def _report_progress(self, progress: Optional[Callable[[str], Awaitable[None]]], stage: str) -> None:
+        if progress:
+            await progress(stage)
+
+    async def _update_knowledge_base(self, agent_id: str, sync_result: dict, name: str) -> KnowledgeBase:
+        knowledge_base = KnowledgeBase(
+            id=str(sync_result["vector_store_id"]),
+            account="kavak_account",
+            file_ids=sync_result["file_ids"],
+            object="vector_store",
+            name=name,
+            created_at=int(time.time())
+        )
+        await Agent.update(
+            self.db,
+            agent_id,
+            {"knowledgeBase": knowledge_base.model_dump()}
+        )
+        self.invalidate_agent(agent_id)
+        return knowledge_base
 
-    async def process_training_file(self, agent_id: str, file_content: bytes, filename: str) -> dict:
-        temp_file_path = None
+    async def process_training_file(self, agent_id: str, csv_path: str, filename: str,
+                                    progress: Optional[Callable[[str], Awaitable[None]]] = None) -> dict:
         try:
-            json_content = self._csv_to_json(file_content)
-            
-            with tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False, encoding='utf-8') as temp_file:
-                temp_file.write(json_content)
-                temp_file_path = temp_file.name
-
-            try:
-                with open(temp_file_path, 'rb') as file:
-                    openai_file = self.client.files.create(
-                        file=file,
-                        purpose="assistants"
-                    )
-
-                vector_store = self.client.vector_stores.create(
-                    name=f"Knowledge Base - {filename}",
-                    file_ids=[openai_file.id]
-                )
+            agent_data = await self.get_agent(agent_id)
+            if not agent_data:
+                raise Exception("Agent not found")
 
-                knowledge_base = KnowledgeBase(
-                    id=str(vector_store.id),
-                    account="kavak_account",
-                    file_ids=[openai_file.id],
-                    object="vector_store",
-                    name=f"Knowledge Base - {filename}",
-                    created_at=int(time.time())
-                )
+            await self._report_progress(progress, "hashing")
+            content_hash = await asyncio.to_thread(file_hash, csv_path)
+
+            with tempfile.TemporaryDirectory() as shard_dir:
+                async def build_shards() -> List[ShardFile]:
+                    await self._report_progress(progress, "parsing")
+                    shards = await asyncio.to_thread(csv_to_hashed_shards, csv_path, shard_dir)
+                    if not shards:
+                        raise ValueError("The CSV file has no rows")
+                    await asyncio.to_thread(catalog_indexes.save_source, agent_id, csv_path)
+                    return shards
 
-                await Agent.update(
-                    self.db,
+                sync_result = await self.knowledge_sync.sync_source(
                     agent_id,
-                    {"knowledgeBase": knowledge_base.model_dump()}
+                    agent_data,
+                    key="catalog",
+                    kind="catalog",
+                    name=f"Knowledge Base - {filename}",
+                    content_hash=content_hash,
+                    build_shards=build_shards,
+                    fresh_store=True,
+                    progress=progress
                 )
 
+            if not sync_result["changed"]:
+                if not catalog_indexes.exists(agent_id):
+                    await asyncio.to_thread(catalog_indexes.save_source, agent_id, csv_path)
                 return {
-                    "message": "File processed successfully",
-                    "file_id": openai_file.id,
-                    "vector_store_id": vector_store.id,
-                    "knowledge_base": knowledge_base.model_dump()
+                    "message": "File unchanged, knowledge base already up to date",
+                    **sync_result
                 }
 
-            finally:
-                if temp_file_path and os.path.exists(temp_file_path):
-                    os.unlink(temp_file_path)
+            knowledge_base = await self._update_knowledge_base(agent_id, sync_result, f"Knowledge Base - {filename}")
+            return {
+                "message": "File processed successfully",
+                **sync_result,
+                "knowledge_base": knowledge_base.model_dump()
+            }
 
         except Exception as e:
-            if temp_file_path and os.path.exists(temp_file_path):
-                os.unlink(temp_file_path)
             raise Exception(f"Error processing file: {str(e)}")
 
-    async def process_training_url(self, agent_id: str, url: str) -> dict:
-        temp_file_path = None
+    async def process_training_url(self, agent_id: str, url: str,
+                                   progress: Optional[Callable[[str], Awaitable[None]]] = None) -> dict:
         try:
+            agent_data = await self.get_agent(agent_id)
+            if not agent_data:
+                raise Exception("Agent not found")
+
+            await self._report_progress(progress, "fetching")
             headers = {"Authorization": f"Bearer {self.jina_api_key}"}
-            response = requests.get(f"https://r.jina.ai/{url}", headers=headers)
+            async with httpx.AsyncClient(timeout=self.jina_timeout) as http_client:
+                response = await http_client.get(f"https://r.jina.ai/{url}", headers=headers)
             
             if response.status_code != 200:
                 raise Exception(f"Error obtaining content from URL: {response.text}")
@@ -300,65 +615,103 @@ class AgentService:
             
             if not text_content:
                 raise Exception("No content obtained from URL")
-            
-            with tempfile.NamedTemporaryFile(mode='w', suffix='.txt', delete=False, encoding='utf-8') as temp_file:
-                temp_file.write(text_content)
-                temp_file_path = temp_file.name
-
-            try:
-                with open(temp_file_path, 'rb') as file:
-                    openai_file = self.client.files.create(
-                        file=file,
-                        purpose="assistants"
-                    )
-
-                agent_data = await self.get_agent(agent_id)
-                if not agent_data:
-                    raise Exception("Agent not found")
-
-                if agent_data.knowledgeBase and agent_data.knowledgeBase.id:
-                    file_batch = self.client.vector_stores.file_batches.create(
-                        vector_store_id=agent_data.knowledgeBase.id,
-                        file_ids=[openai_file.id]
-                    )
-                    vector_store_id = agent_data.knowledgeBase.id
-                else:
-                    vector_store = self.client.vector_stores.create(
-                        name=f"Knowledge Base - {url}",
-                        file_ids=[openai_file.id]
-                    )
-                    vector_store_id = vector_store.id
-
-                knowledge_base = KnowledgeBase(
-                    id=str(vector_store_id),
-                    account="kavak_account",
-                    file_ids=[openai_file.id],
-                    object="vector_store",
+
+            content_hash = hashlib.sha256(text_content.encode("utf-8")).hexdigest()
+
+            with tempfile.TemporaryDirectory() as shard_dir:
+                async def build_shards() -> List[ShardFile]:
+                    shard_path = os.path.join(shard_dir, "page.txt")
+                    await asyncio.to_thread(Path(shard_path).write_text, text_content, encoding="utf-8")
+                    return [ShardFile(bucket=0, path=shard_path, content_hash=content_hash, rows=1)]
+
+                sync_result = await self.knowledge_sync.sync_source(
+                    agent_id,
+                    agent_data,
+                    key=f"url:{url}",
+                    kind="url",
                     name=f"Knowledge Base - {url}",
-                    created_at=int(time.time())
+                    content_hash=content_hash,
+                    build_shards=build_shards,
+                    progress=progress
                 )
 
-                await Agent.update(
-                    self.db,
+            if not sync_result["changed"]:
+                return {
+                    "message": "URL content unchanged, knowledge base already up to date",
+                    **sync_result
+                }
+
+            knowledge_base = await self._update_knowledge_base(agent_id, sync_result, f"Knowledge Base - {url}")
+            return {
+                "message": "URL processed successfully",
+                **sync_result,
+                "knowledge_base": knowledge_base.model_dump()
+            }
+
+        except Exception as e:
+            raise Exception(f"Error processing URL: {str(e)}")
+
+    async def process_training_urls(self, agent_id: str, urls: List[str], sitemap: Optional[str] = None,
+                                    progress: Optional[Callable[[str], Awaitable[None]]] = None) -> dict:
+        try:
+            agent_data = await self.get_agent(agent_id)
+            if not agent_data:
+                raise Exception("Agent not found")
+
+            await self._report_progress(progress, "collecting urls")
+            page_urls = await self.web_ingestion.collect_urls(urls, sitemap)
+            if not page_urls:
+                raise ValueError("No URLs to ingest")
+
+            await self._report_progress(progress, f"fetching {len(page_urls)} pages")
+            pages, failures = await self.web_ingestion.fetch_pages(page_urls, progress)
+            if not pages:
+                raise Exception("No content obtained from any URL")
+            pages, duplicates = dedupe_pages(pages)
+
+            if sitemap:
+                source_key = f"sitemap:{sitemap}"
+            else:
+                source_key = f"urls:{hashlib.sha1(chr(10).join(sorted(page_urls)).encode('utf-8')).hexdigest()}"
+            name = f"Knowledge Base - {sitemap or f'{len(page_urls)} URLs'}"
+
+            with tempfile.TemporaryDirectory() as shard_dir:
+                async def build_shards() -> List[ShardFile]:
+                    return await asyncio.to_thread(pack_pages, pages, shard_dir, self.web_ingestion.pack_bytes)
+
+                sync_result = await self.knowledge_sync.sync_source(
                     agent_id,
-                    {"knowledgeBase": knowledge_base.model_dump()}
+                    agent_data,
+                    key=source_key,
+                    kind="urls",
+                    name=name,
+                    content_hash=pages_hash(pages),
+                    build_shards=build_shards,
+                    progress=progress
                 )
 
+            summary = {
+                "pages": len(pages),
+                "duplicates": duplicates,
+                "failures": failures
+            }
+            if not sync_result["changed"]:
                 return {
-                    "message": "URL processed successfully",
-                    "file_id": openai_file.id,
-                    "vector_store_id": vector_store_id,
-                    "knowledge_base": knowledge_base.model_dump()
+                    "message": "Pages unchanged, knowledge base already up to date",
+                    **summary,
+                    **sync_result
                 }
 
-            finally:
-                if temp_file_path and os.path.exists(temp_file_path):
-                    os.unlink(temp_file_path)
+            knowledge_base = await self._update_knowledge_base(agent_id, sync_result, name)
+            return {
+                "message": "URLs processed successfully",
+                **summary,
+                **sync_result,
+                "knowledge_base": knowledge_base.model_dump()
+            }
 
         except Exception as e:
-            if temp_file_path and os.path.exists(temp_file_path):
-                os.unlink(temp_file_path)
-            raise Exception(f"Error processing URL: {str(e)}")
+            raise Exception(f"Error processing URLs: {str(e)}")
 
     async def process_message(self, message: Dict[str, Any]) -> Dict[str, Any]:
         try:
@@ -0,0 +1,254 @@
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+from agents import function_tool
+import asyncio
+import csv
+import json
+import logging
+import math
+import os
+import shutil
+import threading
+import numpy as np
+from services.router import normalize_text
+
+COLUMN_ALIASES = {
+    "make": ("make", "marca", "brand"),
+    "model": ("model", "modelo"),
+    "version": ("version", "versión", "trim"),
+    "year": ("year", "año", "anio", "ano"),
+    "price": ("price", "precio"),
+    "km": ("km", "kilometraje", "mileage", "kilometers"),
+    "body_type": ("body_type", "body type", "body", "carroceria", "tipo", "segment", "segmento", "category", "categoria")
+}
+TEXT_COLUMNS = ("make", "model", "version", "body_type")
+
+
+def parse_number(value: str) -> Optional[float]:
+    cleaned = value.strip().replace(",", "").replace("$", "")
+    if not cleaned:
+        return None
+    number = float(cleaned)
+    return number if math.isfinite(number) else None
+
+
+class CatalogIndex:
+    def __init__(self, columns: Dict[str, list], row_count: int):
+        self.row_count = row_count
+        self.columns = list(columns.keys())
+        self.raw = columns
+        self.numeric: Dict[str, np.ndarray] = {}
+        self.sorted: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self.inverted: Dict[str, Dict[str, np.ndarray]] = {}
+
+        for name, values in columns.items():
+            numbers = self._as_numbers(values)
+            if numbers is not None:
+                self.numeric[name] = numbers
+                valid = np.flatnonzero(~np.isnan(numbers))
+                order = valid[np.argsort(numbers[valid], kind="stable")]
+                self.sorted[name] = (order, numbers[order])
+            else:
+                postings: Dict[str, list] = {}
+                for row_id, value in enumerate(values):
+                    postings.setdefault(normalize_text(value.strip()), []).append(row_id)
+                self.inverted[name] = {key: np.asarray(ids, dtype=np.int64) for key, ids in postings.items()}
+
+        lowered = {normalize_text(name): name for name in self.columns}
+        self.aliases = {}
+        for canonical, aliases in COLUMN_ALIASES.items():
+            for alias in aliases:
+                if normalize_text(alias) in lowered:
+                    self.aliases[canonical] = lowered[normalize_text(alias)]
+                    break
+
+    @staticmethod
+    def _as_numbers(values: list) -> Optional[np.ndarray]:
+        numbers = np.empty(len(values), dtype=np.float64)
+        has_value = False
+        for row_id, value in enumerate(values):
+            try:
+                number = parse_number(value)
+            except ValueError:
+                return None
+            numbers[row_id] = np.nan if number is None else number
+            has_value = has_value or number is not None
+        return numbers if has_value else None
+
+    @classmethod
+    def from_csv(cls, path: str) -> "CatalogIndex":
+        row_count = 0
+        with open(path, newline="", encoding="utf-8") as csv_file:
+            reader = csv.DictReader(csv_file)
+            fieldnames = [name for name in (reader.fieldnames or []) if name]
+            columns = {name: [] for name in fieldnames}
+            for row in reader:
+                for name in fieldnames:
+                    columns[name].append(row.get(name) or "")
+                row_count += 1
+        return cls(columns, row_count)
+
+    def resolve_column(self, name: str) -> Optional[str]:
+        return self.aliases.get(name, name if name in self.columns else None)
+
+    def _mask_from_ids(self, row_ids: np.ndarray) -> np.ndarray:
+        mask = np.zeros(self.row_count, dtype=bool)
+        mask[row_ids] = True
+        return mask
+
+    def _equals(self, column: str, value: str) -> np.ndarray:
+        postings = self.inverted.get(column, {})
+        return self._mask_from_ids(postings.get(normalize_text(value.strip()), np.empty(0, dtype=np.int64)))
+
+    def _contains(self, text: str) -> np.ndarray:
+        mask = np.ones(self.row_count, dtype=bool)
+        for term in normalize_text(text).split():
+            term_mask = np.zeros(self.row_count, dtype=bool)
+            for canonical in TEXT_COLUMNS:
+                column = self.resolve_column(canonical)
+                for key, row_ids in self.inverted.get(column, {}).items():
+                    if term in key:
+                        term_mask[row_ids] = True
+            mask &= term_mask
+        return mask
+
+    def _range(self, column: str, minimum: Optional[float], maximum: Optional[float]) -> np.ndarray:
+        order, values = self.sorted[column]
+        start = 0 if minimum is None else np.searchsorted(values, minimum, side="left")
+        end = len(values) if maximum is None else np.searchsorted(values, maximum, side="right")
+        return self._mask_from_ids(order[start:end])
+
+    def _row(self, row_id: int) -> dict:
+        row = {}
+        for name in self.columns:
+            if name in self.numeric:
+                value = self.numeric[name][row_id]
+                row[name] = None if np.isnan(value) else (int(value) if value.is_integer() else float(value))
+            else:
+                row[name] = self.raw[name][row_id]
+        return row
+
+    def query(self, equals: Dict[str, str] = None, ranges: Dict[str, Tuple[Optional[float], Optional[float]]] = None,
+              text: Optional[str] = None, sort_by: Optional[str] = None, descending: bool = False,
+              limit: int = 5) -> dict:
+        mask = np.ones(self.row_count, dtype=bool)
+
+        for name, value in (equals or {}).items():
+            column = self.resolve_column(name)
+            if column is None or column not in self.inverted:
+                raise ValueError(f"Unknown text column '{name}'")
+            mask &= self._equals(column, value)
+
+        for name, (minimum, maximum) in (ranges or {}).items():
+            if minimum is None and maximum is None:
+                continue
+            column = self.resolve_column(name)
+            if column is None or column not in self.sorted:
+                raise ValueError(f"Unknown numeric column '{name}'")
+            mask &= self._range(column, minimum, maximum)
+
+        if text:
+            mask &= self._contains(text)
+
+        row_ids = np.flatnonzero(mask)
+        sort_column = self.resolve_column(sort_by) if sort_by else None
+        if sort_column in self.numeric and len(row_ids):
+            keys = self.numeric[sort_column][row_ids]
+            keys = np.where(np.isnan(keys), np.inf, -keys if descending else keys)
+            if limit < len(row_ids):
+                top = np.argpartition(keys, limit - 1)[:limit]
+                row_ids = row_ids[top[np.argsort(keys[top], kind="stable")]]
+            else:
+                row_ids = row_ids[np.argsort(keys, kind="stable")]
+
+        return {
+            "total_matches": int(mask.sum()),
+            "results": [self._row(int(row_id)) for row_id in row_ids[:limit]]
+        }
+
+
+class CatalogIndexRegistry:
+    def __init__(self):
+        self.directory = Path(os.getenv("CATALOG_INDEX_DIR", "data/catalog"))
+        self._indexes: Dict[str, Tuple[float, CatalogIndex]] = {}
+        self._lock = threading.Lock()
+
+    def _path(self, agent_id: str) -> Path:
+        return self.directory / f"{agent_id}.csv"
+
+    def exists(self, agent_id: str) -> bool:
+        return self._path(agent_id).exists()
+
+    def save_source(self, agent_id: str, csv_path: str) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        temp_path = self._path(agent_id).with_suffix(".csv.tmp")
+        shutil.copyfile(csv_path, temp_path)
+        os.replace(temp_path, self._path(agent_id))
+        with self._lock:
+            self._indexes.pop(agent_id, None)
+
+    def get(self, agent_id: str) -> Optional[CatalogIndex]:
+        path = self._path(agent_id)
+        try:
+            mtime = path.stat().st_mtime
+        except OSError:
+            return None
+
+        with self._lock:
+            cached = self._indexes.get(agent_id)
+            if cached and cached[0] == mtime:
+                return cached[1]
+
+        index = CatalogIndex.from_csv(str(path))
+        with self._lock:
+            self._indexes[agent_id] = (mtime, index)
+        logging.info(f"Catalog index loaded for agent {agent_id}: {index.row_count} rows")
+        return index
+
+
+catalog_indexes = CatalogIndexRegistry()
+
+
+def create_catalog_search_tool(agent_id: str):
+    @function_tool(name_override="search_catalog")
+    async def search_catalog(make: Optional[str] = None, model: Optional[str] = None, text: Optional[str] = None,
+                             min_price: Optional[float] = None, max_price: Optional[float] = None,
+                             min_year: Optional[int] = None, max_year: Optional[int] = None,
+                             max_km: Optional[float] = None, sort_by: Optional[str] = None,
+                             descending: Optional[bool] = None, limit: Optional[int] = None) -> str:
+        """Search the car inventory with exact filters, numeric ranges and sorting.
+
+        Args:
+            make: Exact car make, for example Toyota.
+            model: Exact car model, for example RAV4.
+            text: Free words matched against make, model, version and body type, for example "suv" or "cx-5".
+            min_price: Minimum price.
+            max_price: Maximum price.
+            min_year: Minimum model year.
+            max_year: Maximum model year.
+            max_km: Maximum mileage in kilometers.
+            sort_by: Column to sort by: price, year or km. Defaults to price.
+            descending: Sort from highest to lowest.
+            limit: Number of cars to return, between 1 and 20. Defaults to 5.
+        """
+        index = await asyncio.to_thread(catalog_indexes.get, agent_id)
+        if index is None:
+            return json.dumps({"total_matches": 0, "results": [], "error": "No catalog loaded"})
+
+        equals = {name: value for name, value in (("make", make), ("model", model)) if value}
+        ranges = {
+            "price": (min_price, max_price),
+            "year": (min_year, max_year),
+            "km": (None, max_km)
+        }
+        result = index.query(
+            equals=equals,
+            ranges={name: bounds for name, bounds in ranges.items() if index.resolve_column(name) in index.sorted},
+            text=text,
+            sort_by=sort_by or "price",
+            descending=bool(descending),
+            limit=min(max(limit or 5, 1), 20)
+        )
+        return json.dumps(result, ensure_ascii=False)
+
+    return search_catalog
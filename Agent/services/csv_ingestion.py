@@ -0,0 +1,96 @@
+from dataclasses import dataclass
+from typing import List
+import asyncio
+import csv
+import hashlib
+import json
+import math
+import os
+import tempfile
+
+UPLOAD_CHUNK_SIZE = int(os.getenv("TRAINING_UPLOAD_CHUNK_SIZE", 1024 * 1024))
+SHARD_ROWS = int(os.getenv("TRAINING_SHARD_ROWS", 50000))
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+@dataclass
+class ShardFile:
+    bucket: int
+    path: str
+    content_hash: str
+    rows: int
+
+
+async def spool_upload(upload, suffix: str = ".csv") -> str:
+    temp_file = tempfile.NamedTemporaryFile(mode="wb", suffix=suffix, delete=False)
+    try:
+        with temp_file:
+            while True:
+                chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                await asyncio.to_thread(temp_file.write, chunk)
+        return temp_file.name
+    except Exception:
+        os.unlink(temp_file.name)
+        raise
+
+
+def file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as source_file:
+        for chunk in iter(lambda: source_file.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def count_rows(csv_path: str) -> int:
+    with open(csv_path, newline="", encoding="utf-8") as csv_file:
+        return sum(1 for _ in csv.DictReader(csv_file))
+
+
+def bucket_count_for(rows: int, rows_per_shard: int = SHARD_ROWS) -> int:
+    if rows <= rows_per_shard:
+        return 1
+    return 1 << math.ceil(math.log2(rows / rows_per_shard))
+
+
+def csv_to_hashed_shards(csv_path: str, output_dir: str, rows_per_shard: int = SHARD_ROWS) -> List[ShardFile]:
+    bucket_count = bucket_count_for(count_rows(csv_path), rows_per_shard)
+    shard_files = {}
+    row_counts = {}
+    hash_sums = {}
+
+    try:
+        with open(csv_path, newline="", encoding="utf-8") as csv_file:
+            for row in csv.DictReader(csv_file):
+                serialized = json.dumps(row, ensure_ascii=False)
+                row_digest = int.from_bytes(hashlib.blake2b(serialized.encode("utf-8"), digest_size=16).digest(), "big")
+                bucket = row_digest % bucket_count
+
+                shard_file = shard_files.get(bucket)
+                if shard_file is None:
+                    shard_file = open(os.path.join(output_dir, f"shard-{bucket:05d}.json"), "w", encoding="utf-8")
+                    shard_file.write("[")
+                    shard_files[bucket] = shard_file
+                    row_counts[bucket] = 0
+                    hash_sums[bucket] = 0
+
+                shard_file.write("," if row_counts[bucket] else "")
+                shard_file.write(serialized)
+                row_counts[bucket] += 1
+                hash_sums[bucket] = (hash_sums[bucket] + row_digest) % (1 << 128)
+    finally:
+        for shard_file in shard_files.values():
+            shard_file.write("]")
+            shard_file.close()
+
+    return [
+        ShardFile(
+            bucket=bucket,
+            path=shard_files[bucket].name,
+            content_hash=f"{hash_sums[bucket]:032x}:{row_counts[bucket]}",
+            rows=row_counts[bucket]
+        )
+        for bucket in sorted(shard_files)
+    ]
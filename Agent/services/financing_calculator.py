@@ -0,0 +1,98 @@
+from agents import function_tool
+from typing import Dict, List
+import json
+import numpy as np
+import os
+
+ANNUAL_INTEREST_RATE = 0.10
+MIN_DOWN_PAYMENT_PERCENT = 20
+MIN_TERM_YEARS = 3
+MAX_TERM_YEARS = 6
+MAX_TOOL_ALTERNATIVES = int(os.getenv("FINANCING_MAX_ALTERNATIVES", 100))
+
+GRID_FIELDS = (
+    "price", "down_payment_percent", "term_years", "down_payment",
+    "financed_amount", "monthly_payment", "total_payment", "total_interest"
+)
+
+
+def compute_financing_grid(prices: List[float], down_payment_percents: List[float], term_years: List[int],
+                           annual_rate: float = ANNUAL_INTEREST_RATE) -> Dict[str, np.ndarray]:
+    prices = np.asarray(prices, dtype=np.float64)
+    percents = np.asarray(down_payment_percents, dtype=np.float64)
+    terms = np.asarray(term_years, dtype=np.int64)
+
+    if prices.size == 0 or percents.size == 0 or terms.size == 0:
+        raise ValueError("At least one price, down payment and term are required")
+    if np.any(prices <= 0):
+        raise ValueError("Car prices must be greater than zero")
+    if np.any(percents < MIN_DOWN_PAYMENT_PERCENT) or np.any(percents >= 100):
+        raise ValueError(f"Down payment must be at least {MIN_DOWN_PAYMENT_PERCENT}% and less than 100%")
+    if np.any(terms < MIN_TERM_YEARS) or np.any(terms > MAX_TERM_YEARS):
+        raise ValueError(f"Terms must be between {MIN_TERM_YEARS} and {MAX_TERM_YEARS} years")
+
+    price, percent, term = np.meshgrid(prices, percents, terms, indexing="ij")
+    months = term * 12
+    monthly_rate = annual_rate / 12
+
+    down_payment = price * percent / 100
+    financed_amount = price - down_payment
+    if monthly_rate:
+        monthly_payment = financed_amount * monthly_rate / (1 - (1 + monthly_rate) ** -months)
+    else:
+        monthly_payment = financed_amount / months
+    monthly_payment = np.round(monthly_payment, 2)
+    total_payment = monthly_payment * months
+    total_interest = total_payment - financed_amount
+
+    grid = {
+        "price": price,
+        "down_payment_percent": percent,
+        "term_years": term,
+        "down_payment": down_payment,
+        "financed_amount": financed_amount,
+        "monthly_payment": monthly_payment,
+        "total_payment": total_payment,
+        "total_interest": total_interest
+    }
+    return {
+        name: values.ravel() if name == "term_years" else np.round(values.ravel(), 2)
+        for name, values in grid.items()
+    }
+
+
+def financing_rows(grid: Dict[str, np.ndarray]) -> List[dict]:
+    columns = [grid[name].tolist() for name in GRID_FIELDS]
+    return [dict(zip(GRID_FIELDS, row)) for row in zip(*columns)]
+
+
+@function_tool
+def calculate_financing(price: float, down_payment_percent: float, term_years: int) -> str:
+    """Calculate a car financing plan with the fixed 10% annual interest rate.
+
+    Args:
+        price: Car price.
+        down_payment_percent: Down payment as a percentage of the price (minimum 20).
+        term_years: Loan term in years (3 to 6).
+    """
+    grid = compute_financing_grid([price], [down_payment_percent], [term_years])
+    return json.dumps(financing_rows(grid)[0])
+
+
+@function_tool
+def financing_alternatives(prices: List[float], down_payment_percents: List[float], term_years: List[int]) -> str:
+    """Calculate financing plans for every combination of prices, down payments and terms.
+
+    Args:
+        prices: Car prices to compare.
+        down_payment_percents: Down payments as percentages of the price (minimum 20).
+        term_years: Loan terms in years (3 to 6).
+    """
+    combinations = len(prices) * len(down_payment_percents) * len(term_years)
+    if combinations > MAX_TOOL_ALTERNATIVES:
+        raise ValueError(f"Too many combinations ({combinations}), request at most {MAX_TOOL_ALTERNATIVES}")
+    grid = compute_financing_grid(prices, down_payment_percents, term_years)
+    return json.dumps(financing_rows(grid))
+
+
+financing_tools = [calculate_financing, financing_alternatives]
@@ -0,0 +1,43 @@
+from collections import OrderedDict
+from typing import List
+import logging
+import os
+from models.database import Database
+from models.processed_message import ProcessedMessage
+
+
+class IdempotencyStore:
+    def __init__(self, db: Database):
+        self.db = db
+        self.max_entries = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", 10000))
+        self.claim_timeout = float(os.getenv("IDEMPOTENCY_CLAIM_TIMEOUT", 300))
+        self._done: "OrderedDict[str, None]" = OrderedDict()
+
+    def _remember(self, message_sid: str) -> None:
+        self._done[message_sid] = None
+        self._done.move_to_end(message_sid)
+        while len(self._done) > self.max_entries:
+            self._done.popitem(last=False)
+
+    async def claim(self, message_sid: str) -> str:
+        if message_sid in self._done:
+            return "done"
+        try:
+            status = await ProcessedMessage.claim(self.db, message_sid, self.claim_timeout)
+        except Exception as e:
+            logging.error(f"Error claiming message {message_sid}, processing it anyway: {str(e)}")
+            return "claimed"
+        if status == "done":
+            self._remember(message_sid)
+        return status
+
+    async def complete(self, message_sids: List[str]) -> None:
+        if not message_sids:
+            return
+        await ProcessedMessage.complete(self.db, message_sids)
+        for message_sid in message_sids:
+            self._remember(message_sid)
+
+    async def release(self, message_sids: List[str]) -> None:
+        if message_sids:
+            await ProcessedMessage.release(self.db, message_sids)
@@ -0,0 +1,148 @@
+from typing import Awaitable, Callable, List, Optional
+from openai import AsyncOpenAI, NotFoundError
+from pathlib import Path
+import asyncio
+import logging
+from models.agent import Agent
+from models.database import Database
+from models.knowledge_manifest import KnowledgeManifest, ManifestShard, ManifestSource
+from services.csv_ingestion import ShardFile
+
+VECTOR_STORE_BATCH_SIZE = 100
+FILE_BATCH_MAX_FILES = 500
+
+
+class KnowledgeSync:
+    def __init__(self, client: AsyncOpenAI, db: Database, upload_concurrency: int):
+        self.client = client
+        self.db = db
+        self.upload_concurrency = upload_concurrency
+
+    async def upload_files(self, file_paths: List[str]) -> List[str]:
+        semaphore = asyncio.Semaphore(self.upload_concurrency)
+
+        async def upload(file_path: str) -> str:
+            async with semaphore:
+                openai_file = await self.client.files.create(
+                    file=Path(file_path),
+                    purpose="assistants"
+                )
+                return openai_file.id
+
+        return list(await asyncio.gather(*[upload(file_path) for file_path in file_paths]))
+
+    async def attach_files(self, vector_store_id: str, file_ids: List[str]) -> None:
+        for start in range(0, len(file_ids), FILE_BATCH_MAX_FILES):
+            await self.client.vector_stores.file_batches.create(
+                vector_store_id=vector_store_id,
+                file_ids=file_ids[start:start + FILE_BATCH_MAX_FILES]
+            )
+
+    async def create_vector_store(self, name: str, file_ids: List[str]) -> str:
+        if len(file_ids) <= VECTOR_STORE_BATCH_SIZE:
+            vector_store = await self.client.vector_stores.create(name=name, file_ids=file_ids)
+        else:
+            vector_store = await self.client.vector_stores.create(name=name)
+            await self.attach_files(vector_store.id, file_ids)
+        return vector_store.id
+
+    async def retire_files(self, vector_store_id: str, file_ids: List[str]) -> None:
+        semaphore = asyncio.Semaphore(self.upload_concurrency)
+
+        async def retire(file_id: str) -> None:
+            async with semaphore:
+                try:
+                    await self.client.vector_stores.files.delete(vector_store_id=vector_store_id, file_id=file_id)
+                except NotFoundError:
+                    pass
+                try:
+                    await self.client.files.delete(file_id)
+                except NotFoundError:
+                    pass
+
+        results = await asyncio.gather(*[retire(file_id) for file_id in file_ids], return_exceptions=True)
+        for file_id, result in zip(file_ids, results):
+            if isinstance(result, Exception):
+                logging.warning(f"Could not retire file {file_id} from vector store {vector_store_id}: {str(result)}")
+
+    async def sync_source(self, agent_id: str, agent_data: Agent, key: str, kind: str, name: str,
+                          content_hash: str, build_shards: Callable[[], Awaitable[List[ShardFile]]],
+                          fresh_store: bool = False,
+                          progress: Optional[Callable[[str], Awaitable[None]]] = None) -> dict:
+        knowledge_base = agent_data.knowledgeBase
+        vector_store_id = knowledge_base.id if knowledge_base and knowledge_base.id else None
+        manifest = await KnowledgeManifest.find(self.db, agent_id)
+        tracked = manifest is not None and vector_store_id is not None and manifest.vector_store_id == vector_store_id
+
+        if fresh_store and not tracked:
+            vector_store_id = None
+        if not tracked:
+            manifest = KnowledgeManifest(agent_id=agent_id, vector_store_id=vector_store_id)
+
+        previous = manifest.source(key)
+        if vector_store_id and previous and previous.content_hash == content_hash:
+            return {
+                "changed": False,
+                "vector_store_id": vector_store_id,
+                "file_ids": knowledge_base.file_ids,
+                "uploaded": 0,
+                "retired": 0
+            }
+
+        shards = await build_shards()
+        previous_shards = {shard.bucket: shard for shard in previous.shards} if previous else {}
+        kept = []
+        changed = []
+        for shard in shards:
+            previous_shard = previous_shards.get(shard.bucket)
+            if previous_shard and previous_shard.content_hash == shard.content_hash:
+                kept.append(previous_shard)
+            else:
+                changed.append(shard)
+
+        if progress:
+            await progress(f"uploading {len(changed)} of {len(shards)} shards")
+        uploaded_ids = await self.upload_files([shard.path for shard in changed])
+        kept_ids = {shard.file_id for shard in kept}
+        stale_ids = [shard.file_id for shard in previous_shards.values() if shard.file_id not in kept_ids]
+
+        if progress:
+            await progress("indexing")
+        if vector_store_id:
+            await self.attach_files(vector_store_id, uploaded_ids)
+        else:
+            vector_store_id = await self.create_vector_store(name, uploaded_ids)
+        if stale_ids:
+            await self.retire_files(vector_store_id, stale_ids)
+
+        manifest.vector_store_id = vector_store_id
+        manifest.set_source(ManifestSource(
+            key=key,
+            kind=kind,
+            content_hash=content_hash,
+            shards=sorted(
+                kept + [
+                    ManifestShard(bucket=shard.bucket, content_hash=shard.content_hash, file_id=file_id, rows=shard.rows)
+                    for shard, file_id in zip(changed, uploaded_ids)
+                ],
+                key=lambda shard: shard.bucket
+            )
+        ))
+        await KnowledgeManifest.save(self.db, manifest)
+
+        existing_ids = knowledge_base.file_ids if knowledge_base and knowledge_base.id == vector_store_id else []
+        stale = set(stale_ids)
+        file_ids = list(dict.fromkeys(
+            [file_id for file_id in existing_ids if file_id not in stale] + manifest.file_ids()
+        ))
+        logging.info(
+            f"Knowledge source {key} synced for agent {agent_id}: "
+            f"{len(uploaded_ids)} uploaded, {len(kept)} unchanged, {len(stale_ids)} retired"
+        )
+        return {
+            "changed": True,
+            "vector_store_id": vector_store_id,
+            "file_ids": file_ids,
+            "uploaded": len(uploaded_ids),
+            "retired": len(stale_ids)
+        }
@@ -0,0 +1,23 @@
+from services.router import tokenize
+
+SPANISH_WORDS = {
+    "el", "la", "los", "las", "un", "una", "de", "del", "que", "y", "en", "con", "por",
+    "para", "es", "son", "te", "tu", "su", "sus", "puedo", "puedes", "ayudar", "como",
+    "pero", "mas", "si", "muy", "tambien", "nuestro", "nuestra", "nuestros", "tenemos",
+    "hola", "gracias", "cual", "donde", "cuando", "esta", "estan", "precio", "auto", "autos"
+}
+ENGLISH_WORDS = {
+    "the", "a", "an", "of", "and", "in", "with", "for", "is", "are", "you", "your",
+    "our", "we", "can", "help", "how", "but", "more", "very", "also", "have", "has",
+    "hello", "thanks", "which", "where", "when", "this", "that", "price", "car", "cars"
+}
+SPANISH_CHARACTERS = set("ñ¿¡áéíóú")
+
+
+def is_spanish(text: str) -> bool:
+    tokens = tokenize(text)
+    spanish_hits = sum(1 for token in tokens if token in SPANISH_WORDS)
+    english_hits = sum(1 for token in tokens if token in ENGLISH_WORDS)
+    if any(char in SPANISH_CHARACTERS for char in text.lower()):
+        spanish_hits += 2
+    return spanish_hits > english_hits
@@ -0,0 +1,23 @@
+from typing import Dict
+import threading
+
+
+class Metrics:
+    def __init__(self):
+        self._counters: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def increment(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def get(self, name: str) -> float:
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return dict(self._counters)
+
+
+metrics = Metrics()
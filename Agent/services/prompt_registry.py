@@ -0,0 +1,68 @@
+import logging
+import os
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Tuple
+
+PLACEHOLDER_PATTERN = re.compile(r"\{([a-zA-Z_][a-zA-Z0-9_]*)\}")
+
+
+class PromptRegistry:
+    def __init__(self, prompts_dir: str = "prompts"):
+        self.prompts_dir = Path(prompts_dir)
+        self.reload_interval = float(os.getenv("PROMPT_RELOAD_INTERVAL", 5))
+        self._version = 0
+        self._templates: Dict[str, Tuple[float, str]] = {}
+        self._lock = threading.Lock()
+        self._last_check = time.monotonic()
+
+    def _path(self, prompt_name: str) -> Path:
+        return self.prompts_dir / f"{prompt_name}.txt"
+
+    def _read(self, prompt_name: str) -> Tuple[float, str]:
+        prompt_path = self._path(prompt_name)
+        if not prompt_path.exists():
+            raise Exception(f"Prompt file not found. Please ensure 'prompts/{prompt_name}.txt' exists.")
+        return prompt_path.stat().st_mtime, prompt_path.read_text(encoding='utf-8')
+
+    def _refresh_if_due(self):
+        now = time.monotonic()
+        if now - self._last_check < self.reload_interval:
+            return
+        self._last_check = now
+        for prompt_name, (mtime, _) in list(self._templates.items()):
+            try:
+                current_mtime = self._path(prompt_name).stat().st_mtime
+            except OSError:
+                continue
+            if current_mtime != mtime:
+                self._templates[prompt_name] = self._read(prompt_name)
+                self._version += 1
+                logging.info(f"Prompt '{prompt_name}' changed on disk, reloaded (version {self._version})")
+
+    @property
+    def version(self) -> int:
+        with self._lock:
+            self._refresh_if_due()
+            return self._version
+
+    def get(self, prompt_name: str) -> str:
+        with self._lock:
+            self._refresh_if_due()
+            entry = self._templates.get(prompt_name)
+            if entry is None:
+                entry = self._read(prompt_name)
+                self._templates[prompt_name] = entry
+            return entry[1]
+
+    @staticmethod
+    def render(template: str, **values) -> str:
+        return PLACEHOLDER_PATTERN.sub(
+            lambda match: str(values[match.group(1)]) if match.group(1) in values else match.group(0),
+            template
+        )
+
+
+prompt_registry = PromptRegistry()
@@ -4,25 +4,42 @@ import os
 import logging
 import threading
 import asyncio
-from typing import Callable, Dict, Any
+import concurrent.futures
+from contextlib import asynccontextmanager
+from typing import Callable, Dict, Any, List, Optional
 from dotenv import load_dotenv
 from services.agent_service import AgentService
 from models.agent import Agent
+from models.agent_cache import agent_cache
 from models.database import Database
+from services.idempotency import IdempotencyStore
+from services.metrics import metrics
+from services.queue_shards import queue_shards, shard_queue_name
+from services.retry_topology import declare_retry_topology, retry_delays, retry_or_dead_letter
 
 
 load_dotenv()
 
 class QueueService:
-    def __init__(self):
+    def __init__(self, shards: Optional[List[int]] = None):
         self._connection = None
         self._channel = None
         self._closing = False
         self._consuming = False
         self._lock = threading.Lock()
         self._loop = None
+        self._loop_thread = None
+        self._semaphore = None
+        self._conversation_locks: Dict[str, list] = {}
+        self._inflight = set()
+        self._pending_batches: Dict[str, dict] = {}
         
         self.input_queue = os.getenv('RABBITMQ_INPUT_QUEUE', 'agent_input_queue')
+        shard_count = queue_shards()
+        self.input_queues = [
+            shard_queue_name(self.input_queue, shard, shard_count)
+            for shard in (shards if shards is not None else range(shard_count))
+        ]
         self.output_queue = os.getenv('RABBITMQ_OUTPUT_QUEUE', 'agent_output_queue')
         
         self.rabbitmq_host = os.getenv('RABBITMQ_HOST', 'localhost')
@@ -30,9 +47,15 @@ class QueueService:
         self.rabbitmq_user = os.getenv('RABBITMQ_USER', 'guest')
         self.rabbitmq_password = os.getenv('RABBITMQ_PASSWORD', 'guest')
         
-        self._prefetch_count = 1
+        self._max_concurrency = max(1, int(os.getenv('RABBITMQ_MAX_CONCURRENCY', 10)))
+        self._prefetch_count = int(os.getenv('RABBITMQ_PREFETCH_COUNT', self._max_concurrency))
+        self._coalesce_window = float(os.getenv('RABBITMQ_COALESCE_WINDOW_MS', 0)) / 1000
+        self._coalesce_max_wait = float(os.getenv('RABBITMQ_COALESCE_MAX_WAIT_MS', 3000)) / 1000
+        self._retry_delays = retry_delays()
         self.agent_service = AgentService()
-        self.db = Database()
+        self.db = Database.instance()
+        self.idempotency = IdempotencyStore(self.db)
+        self._watch_agents = os.getenv("AGENT_CACHE_CHANGE_STREAM", "true").lower() == "true"
 
     def connect(self):
         try:
@@ -55,65 +78,190 @@ class QueueService:
                 if self._connection is None or self._connection.is_closed:
                     self._connection = self.connect()
                     self._channel = self._connection.channel()
-                    self._channel.queue.declare(self.input_queue, durable=True)
+                    for input_queue in self.input_queues:
+                        self._channel.queue.declare(input_queue, durable=True)
+                        declare_retry_topology(self._channel, input_queue, self._retry_delays)
                     self._channel.queue.declare(self.output_queue, durable=True)
                     logging.info("Connection to RabbitMQ established successfully")
         except Exception as e:
             logging.error(f"Error connecting to RabbitMQ: {str(e)}")
             raise
 
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+
+    def _start_loop(self):
+        self._loop = asyncio.new_event_loop()
+        self._semaphore = asyncio.Semaphore(self._max_concurrency)
+        self._loop_thread = threading.Thread(target=self._run_loop, daemon=True)
+        self._loop_thread.start()
+        if self._watch_agents:
+            asyncio.run_coroutine_threadsafe(agent_cache.watch(self.db), self._loop)
+
     def start_consuming(self):
         try:
             self.setup_connection()
             self._channel.basic.qos(prefetch_count=self._prefetch_count)
             
-            self._loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(self._loop)
+            self._start_loop()
             
             def on_message(message):
                 try:
-                    self._loop.run_until_complete(
-                        self._process_message(message)
-                    )
+                    future = asyncio.run_coroutine_threadsafe(self._dispatch(message), self._loop)
+                    self._inflight.add(future)
+                    future.add_done_callback(self._inflight.discard)
                 except Exception as e:
-                    logging.error(f"Error processing message: {str(e)}")
-                    message.reject(requeue=True)
+                    logging.error(f"Error scheduling message: {str(e)}")
+                    self._retry_or_dead_letter(message, e)
             
-            self._channel.basic.consume(
-                queue=self.input_queue,
-                callback=on_message,
-                no_ack=False
-            )
+            for input_queue in self.input_queues:
+                self._channel.basic.consume(
+                    queue=input_queue,
+                    callback=on_message,
+                    no_ack=False
+                )
             
-            logging.info(f"Starting consumption of messages from queue {self.input_queue}")
+            logging.info(
+                f"Starting consumption of messages from {', '.join(self.input_queues)} "
+                f"(max concurrency: {self._max_concurrency}, prefetch: {self._prefetch_count})"
+            )
             self._consuming = True
             self._channel.start_consuming()
         except Exception as e:
             logging.error(f"Error starting message consumption: {str(e)}")
             raise
 
-    async def _process_message(self, message):
+    def _conversation_key(self, message) -> Optional[str]:
+        try:
+            message_data = json.loads(message.body)
+            from_number = message_data.get("from", "").replace("whatsapp:+", "")
+            to_number = message_data.get("to", "").replace("whatsapp:+", "")
+            return f"{to_number}:{from_number}" if from_number else None
+        except Exception:
+            return None
+
+    @asynccontextmanager
+    async def _conversation_slot(self, conversation_id: Optional[str]):
+        if conversation_id is None:
+            yield
+            return
+
+        entry = self._conversation_locks.get(conversation_id)
+        if entry is None:
+            entry = [asyncio.Lock(), 0]
+            self._conversation_locks[conversation_id] = entry
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                self._conversation_locks.pop(conversation_id, None)
+
+    def _message_sid(self, message) -> Optional[str]:
+        try:
+            return json.loads(message.body).get("message_sid") or None
+        except Exception:
+            return None
+
+    async def _dispatch(self, message):
+        try:
+            key = self._conversation_key(message)
+            if self._coalesce_window <= 0 or key is None:
+                await self._run_batch(key, [message])
+                return
+
+            loop = asyncio.get_running_loop()
+            batch = self._pending_batches.get(key)
+            if batch is None:
+                batch = {
+                    "messages": [],
+                    "timer": None,
+                    "started_at": loop.time(),
+                    "done": loop.create_future()
+                }
+                self._pending_batches[key] = batch
+
+            batch["messages"].append(message)
+            if batch["timer"]:
+                batch["timer"].cancel()
+            delay = min(
+                self._coalesce_window,
+                max(0, batch["started_at"] + self._coalesce_max_wait - loop.time())
+            )
+            batch["timer"] = loop.call_later(delay, self._flush_batch, key)
+            await asyncio.shield(batch["done"])
+        except Exception as e:
+            logging.error(f"Error dispatching message: {str(e)}")
+
+    def _flush_batch(self, key: str):
+        batch = self._pending_batches.pop(key, None)
+        if batch is None:
+            return
+        if batch["timer"]:
+            batch["timer"].cancel()
+
+        async def complete():
+            try:
+                await self._run_batch(key, batch["messages"])
+            finally:
+                batch["done"].set_result(None)
+
+        asyncio.get_running_loop().create_task(complete())
+
+    def _flush_all_batches(self):
+        for key in list(self._pending_batches):
+            self._flush_batch(key)
+
+    async def _run_batch(self, key: Optional[str], messages: list):
+        async with self._conversation_slot(key):
+            async with self._semaphore:
+                messages = await self._claim_messages(messages)
+                if messages:
+                    await self._process_messages(messages)
+
+    async def _claim_messages(self, messages: list) -> list:
+        claimed = []
+        for message in messages:
+            message_sid = self._message_sid(message)
+            status = await self.idempotency.claim(message_sid) if message_sid else "claimed"
+            if status == "claimed":
+                claimed.append(message)
+            elif status == "done":
+                logging.info(f"Duplicate message {message_sid} dropped")
+                metrics.increment("duplicate_messages_total")
+                message.ack()
+            else:
+                self._retry_or_dead_letter(message, Exception(f"Message {message_sid} is still being processed"))
+        return claimed
+
+    async def _process_messages(self, messages: list):
         try:
-            body = message.body
-            message_data = json.loads(body)
-            logging.info(f"New message received in queue {self.input_queue}")
+            logging.info(f"New message received in queue {self._source_queue(messages[-1])}")
+            messages_data = [json.loads(message.body) for message in messages]
+            message_data = messages_data[-1]
             logging.info(f"Message: {message_data}")
+            if len(messages_data) > 1:
+                logging.info(f"Coalesced {len(messages_data)} consecutive messages into one turn")
             
             to_number = message_data.get("to", "").replace("whatsapp:+", "")
             if not to_number:
                 raise ValueError("No phone number found in message")
             
-            agent_data = await Agent.find_by_phone(self.db, to_number)
+            agent_data = await Agent.get_cached_by_phone(self.db, to_number)
             if not agent_data:
                 raise ValueError(f"No agent found with phone number {to_number}")
             
             agent_id = str(agent_data["_id"])
             conversation_id = message_data.get("from", "").replace("whatsapp:+", "")
+            text = "\n".join([data.get("message", "") for data in messages_data if data.get("message")])
             
             response = await self.agent_service.chat(
                 agent_id=agent_id,
                 conversation_id=conversation_id,
-                message=message_data.get("message", ""),
+                message=text,
                 channel=message_data.get("channel")
             )
 
@@ -127,12 +275,50 @@ class QueueService:
                 }
             )
             
-            message.ack()
+            await self._settle(self.idempotency.complete, messages)
+            for message in messages:
+                message.ack()
             logging.info(f"Message processed successfully")
             
         except Exception as e:
             logging.error(f"Error processing message: {str(e)}")
-            message.reject(requeue=False)
+            await self._settle(self.idempotency.release, messages)
+            for message in messages:
+                self._retry_or_dead_letter(message, e, permanent=isinstance(e, ValueError))
+
+    def _source_queue(self, message) -> str:
+        routing_key = (message.method or {}).get("routing_key")
+        return routing_key if routing_key in self.input_queues else self.input_queues[0]
+
+    def _retry_or_dead_letter(self, message, error: Exception, permanent: bool = False):
+        retry_or_dead_letter(self._channel, message, self._source_queue(message), self._retry_delays, error, permanent)
+
+    async def _settle(self, action, messages: list):
+        message_sids = [sid for sid in (self._message_sid(message) for message in messages) if sid]
+        try:
+            await action(message_sids)
+        except Exception as e:
+            logging.error(f"Error updating processed messages {message_sids}: {str(e)}")
+
+    def drain(self, timeout: float = 30.0) -> bool:
+        try:
+            if self._channel and self._channel.is_open:
+                self._channel.stop_consuming()
+        except Exception as e:
+            logging.error(f"Error stopping consumption: {str(e)}")
+
+        if self._loop and self._loop.is_running():
+            self._loop.call_soon_threadsafe(self._flush_all_batches)
+
+        pending = list(self._inflight)
+        if not pending:
+            return True
+
+        logging.info(f"Waiting for {len(pending)} in-flight messages to finish")
+        _, not_done = concurrent.futures.wait(pending, timeout=timeout)
+        if not_done:
+            logging.warning(f"{len(not_done)} messages still in flight after {timeout}s, they will be redelivered")
+        return not not_done
 
     def close(self):
         with self._lock:
@@ -143,7 +329,7 @@ class QueueService:
                 if self._connection and self._connection.is_open:
                     self._connection.close()
                 if self._loop and self._loop.is_running():
-                    self._loop.stop()
+                    self._loop.call_soon_threadsafe(self._loop.stop)
             except Exception as e:
                 logging.error(f"Error closing connection: {str(e)}")
             finally:
@@ -0,0 +1,19 @@
+from typing import List
+import os
+import zlib
+
+
+def queue_shards() -> int:
+    return max(1, int(os.getenv("AGENT_QUEUE_SHARDS", 1)))
+
+
+def shard_queue_name(queue: str, shard: int, shards: int) -> str:
+    return queue if shards == 1 else f"{queue}.shard.{shard}"
+
+
+def shard_queue_names(queue: str, shards: int) -> List[str]:
+    return [shard_queue_name(queue, shard, shards) for shard in range(shards)]
+
+
+def shard_for(conversation_key: str, shards: int) -> int:
+    return zlib.crc32(conversation_key.encode("utf-8")) % shards
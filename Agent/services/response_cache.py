@@ -0,0 +1,105 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional
+import os
+import threading
+import time
+import zlib
+import numpy as np
+from services.router import tokenize
+
+EMBEDDING_DIMENSIONS = 512
+
+
+def normalize_message(message: str) -> str:
+    return " ".join(tokenize(message))
+
+
+def embed(message: str) -> np.ndarray:
+    normalized = normalize_message(message)
+    vector = np.zeros(EMBEDDING_DIMENSIONS, dtype=np.float32)
+    padded = f"  {normalized}  "
+    features = [padded[index:index + 3] for index in range(len(padded) - 2)] + normalized.split()
+    for feature in features:
+        vector[zlib.crc32(feature.encode("utf-8")) % EMBEDDING_DIMENSIONS] += 1
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+@dataclass
+class CachedResponse:
+    message: str
+    response: str
+    embedding: np.ndarray
+    latency_ms: float
+    expires_at: float
+
+
+class ResponseCache:
+    def __init__(self):
+        self.threshold = float(os.getenv("RESPONSE_CACHE_THRESHOLD", 0.85))
+        self.ttl = float(os.getenv("RESPONSE_CACHE_TTL", 3600))
+        self.max_entries = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", 500))
+        self._namespaces: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def _namespace(self, agent_id: str, version: str) -> dict:
+        namespace = self._namespaces.get(agent_id)
+        if namespace is None or namespace["version"] != version:
+            namespace = {"version": version, "entries": OrderedDict(), "matrix": None, "keys": []}
+            self._namespaces[agent_id] = namespace
+        return namespace
+
+    def _evict_expired(self, namespace: dict) -> None:
+        now = time.monotonic()
+        expired = [key for key, entry in namespace["entries"].items() if entry.expires_at < now]
+        for key in expired:
+            del namespace["entries"][key]
+        if expired:
+            namespace["matrix"] = None
+
+    def lookup(self, agent_id: str, version: str, message: str) -> Optional[CachedResponse]:
+        key = normalize_message(message)
+        with self._lock:
+            namespace = self._namespace(agent_id, version)
+            self._evict_expired(namespace)
+            entries = namespace["entries"]
+
+            entry = entries.get(key)
+            if entry is not None:
+                entries.move_to_end(key)
+                return entry
+            if not entries:
+                return None
+
+            if namespace["matrix"] is None:
+                namespace["keys"] = list(entries.keys())
+                namespace["matrix"] = np.stack([entries[cached].embedding for cached in namespace["keys"]])
+            similarities = namespace["matrix"] @ embed(message)
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                return None
+            return entries[namespace["keys"][best]]
+
+    def store(self, agent_id: str, version: str, message: str, response: str, latency_ms: float) -> None:
+        key = normalize_message(message)
+        with self._lock:
+            namespace = self._namespace(agent_id, version)
+            namespace["entries"][key] = CachedResponse(
+                message=key,
+                response=response,
+                embedding=embed(message),
+                latency_ms=latency_ms,
+                expires_at=time.monotonic() + self.ttl
+            )
+            namespace["entries"].move_to_end(key)
+            while len(namespace["entries"]) > self.max_entries:
+                namespace["entries"].popitem(last=False)
+            namespace["matrix"] = None
+
+    def invalidate(self, agent_id: str) -> None:
+        with self._lock:
+            self._namespaces.pop(agent_id, None)
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,71 @@
+from datetime import datetime, UTC
+from typing import List
+import logging
+import os
+
+RETRY_COUNT_HEADER = "x-retry-count"
+
+
+def retry_delays() -> List[int]:
+    delays = os.getenv("RABBITMQ_RETRY_DELAYS_MS", "5000,30000,300000")
+    return [int(delay) for delay in delays.split(",") if delay.strip()]
+
+
+def retry_queue_name(queue: str, tier: int) -> str:
+    return f"{queue}.retry.{tier}"
+
+
+def dead_letter_queue_name(queue: str) -> str:
+    return f"{queue}.dlq"
+
+
+def declare_retry_topology(channel, queue: str, delays: List[int]) -> None:
+    for tier, delay in enumerate(delays):
+        channel.queue.declare(
+            retry_queue_name(queue, tier),
+            durable=True,
+            arguments={
+                "x-message-ttl": delay,
+                "x-dead-letter-exchange": "",
+                "x-dead-letter-routing-key": queue
+            }
+        )
+    channel.queue.declare(dead_letter_queue_name(queue), durable=True)
+
+
+def retry_count(message) -> int:
+    headers = message.properties.get("headers") or {}
+    try:
+        return int(headers.get(RETRY_COUNT_HEADER, 0))
+    except (TypeError, ValueError):
+        return 0
+
+
+def retry_or_dead_letter(channel, message, queue: str, delays: List[int], error: Exception,
+                         permanent: bool = False) -> None:
+    attempts = retry_count(message)
+    headers = dict(message.properties.get("headers") or {})
+    headers[RETRY_COUNT_HEADER] = attempts + 1
+    headers["x-last-error"] = str(error)[:500]
+
+    if permanent or attempts >= len(delays):
+        routing_key = dead_letter_queue_name(queue)
+        headers["x-original-queue"] = queue
+        headers["x-failed-at"] = datetime.now(UTC).isoformat()
+    else:
+        routing_key = retry_queue_name(queue, attempts)
+
+    try:
+        channel.basic.publish(
+            body=message.body,
+            routing_key=routing_key,
+            properties={
+                "delivery_mode": 2,
+                "headers": headers
+            }
+        )
+        message.ack()
+        logging.warning(f"Message moved to {routing_key} after attempt {attempts + 1}: {str(error)}")
+    except Exception as e:
+        logging.error(f"Error moving message to {routing_key}, requeueing it: {str(e)}")
+        message.reject(requeue=True)
@@ -0,0 +1,169 @@
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+import json
+import logging
+import math
+import os
+import re
+import unicodedata
+
+ROUTES = ("support", "catalog", "financing")
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+KEYWORD_RULES = {
+    "financing": [
+        "financ*", "credito*", "mensualidad*", "enganche*", "plazo", "plazos", "interes", "intereses",
+        "tasa", "tasas",
+        "cuota*", "prestamo*", "amortiz*", "pago mensual", "pagos mensuales",
+        "loan*", "down payment", "monthly payment*", "installment*"
+    ],
+    "catalog": [
+        "disponible*", "modelo*", "version*", "km", "kilometraje", "suv*", "sedan*",
+        "hatchback*", "pickup*", "camioneta*", "carro*", "coche*", "toyota", "nissan",
+        "honda", "mazda", "volkswagen", "vw", "chevrolet", "ford", "kia", "hyundai",
+        "bmw", "audi", "mercedes", "seat", "renault", "jeep", "inventario", "catalogo"
+    ],
+    "support": [
+        "sucursal*", "ubicacion*", "direccion*", "horario*", "garantia*", "documento*",
+        "requisito*", "devolucion*", "contacto", "telefono", "inspeccion*", "sede*",
+        "warranty", "branch*", "location*", "opening hours", "refund*"
+    ]
+}
+
+
+@dataclass
+class RouteDecision:
+    route: str
+    confidence: float
+    source: str
+
+
+def normalize_text(text: str) -> str:
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join([char for char in decomposed if not unicodedata.combining(char)])
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(normalize_text(text))
+
+
+class KeywordRouter:
+    def __init__(self, rules: Dict[str, List[str]] = None):
+        self.rules = {}
+        for route, keywords in (rules or KEYWORD_RULES).items():
+            self.rules[route] = [
+                (keyword.rstrip("*"), keyword.endswith("*"))
+                for keyword in keywords
+            ]
+
+    def _hits(self, tokens: List[str], text: str, keywords: List[Tuple[str, bool]]) -> int:
+        hits = 0
+        for keyword, is_prefix in keywords:
+            if " " in keyword:
+                hits += 1 if keyword in text else 0
+            elif is_prefix:
+                hits += 1 if any(token.startswith(keyword) for token in tokens) else 0
+            else:
+                hits += 1 if keyword in tokens else 0
+        return hits
+
+    def route(self, message: str) -> Optional[RouteDecision]:
+        text = normalize_text(message)
+        tokens = TOKEN_PATTERN.findall(text)
+        scores = {route: self._hits(tokens, text, keywords) for route, keywords in self.rules.items()}
+        total = sum(scores.values())
+        if total == 0:
+            return None
+
+        route, hits = max(scores.items(), key=lambda item: item[1])
+        if hits == total:
+            confidence = 0.9 if hits == 1 else 0.95
+        else:
+            confidence = 0.9 * hits / total
+        return RouteDecision(route=route, confidence=confidence, source="keywords")
+
+
+class NaiveBayesRouter:
+    def __init__(self, model: dict):
+        self.routes = model["routes"]
+        self.vocabulary_size = max(1, model["vocabulary_size"])
+        self.total_documents = sum(route["doc_count"] for route in self.routes.values())
+
+    @staticmethod
+    def _features(message: str) -> List[str]:
+        tokens = tokenize(message)
+        return tokens + [f"{first}_{second}" for first, second in zip(tokens, tokens[1:])]
+
+    @classmethod
+    def train(cls, samples: Iterable[Tuple[str, str]]) -> dict:
+        routes = {}
+        vocabulary = set()
+        for message, route in samples:
+            entry = routes.setdefault(route, {"doc_count": 0, "token_count": 0, "tokens": {}})
+            entry["doc_count"] += 1
+            for feature in cls._features(message):
+                entry["tokens"][feature] = entry["tokens"].get(feature, 0) + 1
+                entry["token_count"] += 1
+                vocabulary.add(feature)
+        return {"routes": routes, "vocabulary_size": len(vocabulary)}
+
+    @classmethod
+    def load(cls, path: str) -> Optional["NaiveBayesRouter"]:
+        model_path = Path(path)
+        if not model_path.exists():
+            return None
+        return cls(json.loads(model_path.read_text(encoding="utf-8")))
+
+    @staticmethod
+    def save(model: dict, path: str) -> None:
+        model_path = Path(path)
+        model_path.parent.mkdir(parents=True, exist_ok=True)
+        model_path.write_text(json.dumps(model, ensure_ascii=False), encoding="utf-8")
+
+    def route(self, message: str) -> Optional[RouteDecision]:
+        features = self._features(message)
+        if not features or not self.total_documents:
+            return None
+
+        log_probabilities = {}
+        for route, entry in self.routes.items():
+            denominator = entry["token_count"] + self.vocabulary_size
+            score = math.log(entry["doc_count"] / self.total_documents)
+            for feature in features:
+                score += math.log((entry["tokens"].get(feature, 0) + 1) / denominator)
+            log_probabilities[route] = score
+
+        best = max(log_probabilities.values())
+        normalizer = sum(math.exp(score - best) for score in log_probabilities.values())
+        route = max(log_probabilities, key=log_probabilities.get)
+        return RouteDecision(route=route, confidence=1 / normalizer, source="classifier")
+
+
+class PreRouter:
+    def __init__(self, routers: list, threshold: float):
+        self.routers = routers
+        self.threshold = threshold
+
+    def route(self, message: str) -> Optional[RouteDecision]:
+        for router in self.routers:
+            decision = router.route(message)
+            if decision and decision.route in ROUTES and decision.confidence >= self.threshold:
+                return decision
+        return None
+
+
+def build_pre_router() -> Optional[PreRouter]:
+    if os.getenv("AGENT_PRE_ROUTER", "false").lower() != "true":
+        return None
+
+    routers = [KeywordRouter()]
+    model_path = os.getenv("ROUTER_MODEL_PATH", "data/router_model.json")
+    classifier = NaiveBayesRouter.load(model_path)
+    if classifier:
+        routers.append(classifier)
+        logging.info(f"Pre-router classifier loaded from {model_path}")
+    else:
+        logging.info(f"No pre-router classifier found at {model_path}, using keyword rules only")
+
+    return PreRouter(routers, float(os.getenv("ROUTER_CONFIDENCE_THRESHOLD", 0.85)))
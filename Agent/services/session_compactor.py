@@ -0,0 +1,90 @@
+from models.database import Database
+from models.session import Session
+from models.session_archive import SessionArchive
+from services.prompt_registry import prompt_registry
+from agents import Runner, Agent as OpenAIAgent
+from typing import List, Optional
+import asyncio
+import logging
+import os
+
+
+class SessionCompactor:
+    def __init__(self, db: Database):
+        self.db = db
+        self.enabled = os.getenv("SESSION_COMPACTION", "true").lower() == "true"
+        self.threshold = int(os.getenv("SESSION_COMPACT_THRESHOLD", 200))
+        self.keep = int(os.getenv("SESSION_COMPACT_KEEP", 20))
+        self.bucket_size = int(os.getenv("SESSION_ARCHIVE_BUCKET_SIZE", 100))
+        self.prompts = prompt_registry
+        self._running = set()
+        self._tasks = set()
+
+    def maybe_schedule(self, session: Session, added: int) -> None:
+        if not self.enabled:
+            return
+        if session.message_count is not None and session.message_count + added <= self.threshold:
+            return
+
+        key = (session.agent_id, session.conversation_id)
+        if key in self._running:
+            return
+        self._running.add(key)
+
+        task = asyncio.get_running_loop().create_task(self.compact(session.agent_id, session.conversation_id))
+        self._tasks.add(task)
+        task.add_done_callback(lambda finished: (self._tasks.discard(finished), self._running.discard(key)))
+
+    def _create_summary_agent(self) -> OpenAIAgent:
+        return OpenAIAgent(
+            name="session_summarizer",
+            instructions=self.prompts.get("summary_agent")
+        )
+
+    async def summarize(self, previous_summary: Optional[str], messages: List[dict]) -> str:
+        transcript = "\n".join([f"{message['role']}: {message['content']}" for message in messages])
+        result = await Runner.run(
+            self._create_summary_agent(),
+            f"Previous summary:\n{previous_summary or ''}\n\nOlder messages:\n{transcript}"
+        )
+        return result.final_output
+
+    async def compact(self, agent_id: str, conversation_id: str) -> None:
+        try:
+            state = await Session.find_compaction_state(self.db, agent_id, conversation_id)
+            if not state:
+                return
+
+            session_id = state["_id"]
+            if state["live_count"] <= self.threshold:
+                await Session.sync_message_count(self.db, session_id)
+                return
+
+            archived = state["live_count"] - self.keep
+            messages = await Session.find_oldest_messages(self.db, session_id, archived)
+            summary = await self.summarize(state.get("summary"), messages)
+
+            await SessionArchive.save_buckets(self.db, [
+                SessionArchive(
+                    session_id=str(session_id),
+                    agent_id=agent_id,
+                    conversation_id=conversation_id,
+                    start=state["archived_count"] + offset,
+                    messages=messages[offset:offset + self.bucket_size]
+                )
+                for offset in range(0, len(messages), self.bucket_size)
+            ])
+
+            applied = await Session.apply_compaction(
+                self.db,
+                session_id,
+                len(messages),
+                summary,
+                state["archived_count"]
+            )
+            if applied:
+                logging.info(f"Session {session_id} compacted: {len(messages)} messages archived")
+            else:
+                logging.warning(f"Session {session_id} was compacted concurrently, skipping")
+        except Exception as e:
+            logging.error(f"Error compacting session {conversation_id}: {str(e)}")
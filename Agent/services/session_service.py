@@ -5,7 +5,7 @@ import logging
 
 class SessionService:
     def __init__(self):
-        self.db = Database()
+        self.db = Database.instance()
 
     async def create_session(self, agent_id: str, conversation_id: str) -> Session:
         session = Session(
@@ -18,7 +18,7 @@ class SessionService:
         return Session(**created_session)
 
     async def get_or_create_session(self, agent_id: str, conversation_id: str) -> Session:
-        session_data = await Session.find_by_conversation_id(self.db, conversation_id)
+        session_data = await Session.find_by_conversation_id(self.db, conversation_id, agent_id)
         if session_data:
             return Session(**session_data)
         
@@ -0,0 +1,67 @@
+from models.session import Session
+from models.database import Database
+from pymongo import UpdateOne
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import logging
+import os
+
+
+class SessionWriteBuffer:
+    def __init__(self, db: Database):
+        self.db = db
+        self.flush_interval = float(os.getenv("SESSION_WRITE_BEHIND_INTERVAL_MS", 20)) / 1000
+        self.max_batch = int(os.getenv("SESSION_WRITE_BEHIND_MAX_BATCH", 500))
+        self._pending: Dict[Tuple[str, str], dict] = {}
+        self._flush_handle = None
+
+    async def commit(self, agent_id: str, conversation_id: str, messages: List[dict], channel: Optional[str] = None) -> None:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        entry = self._pending.setdefault(
+            (agent_id, conversation_id),
+            {"messages": [], "channel": None, "futures": []}
+        )
+        entry["messages"].extend(messages)
+        if channel:
+            entry["channel"] = channel
+        entry["futures"].append(future)
+
+        if len(self._pending) >= self.max_batch:
+            self._start_flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.flush_interval, self._start_flush)
+
+        await future
+
+    def _start_flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        batch, self._pending = self._pending, {}
+        if batch:
+            asyncio.get_running_loop().create_task(self._flush(batch))
+
+    async def _flush(self, batch: Dict[Tuple[str, str], dict]):
+        operations = [
+            UpdateOne(
+                *Session.turn_operation(agent_id, conversation_id, entry["messages"], entry["channel"]),
+                upsert=True
+            )
+            for (agent_id, conversation_id), entry in batch.items()
+        ]
+        futures = [future for entry in batch.values() for future in entry["futures"]]
+
+        try:
+            await self.db.sessions.bulk_write(operations, ordered=False)
+            logging.info(f"Session write buffer flushed {len(futures)} turns in {len(operations)} operations")
+            for future in futures:
+                if not future.done():
+                    future.set_result(None)
+        except Exception as e:
+            logging.error(f"Error flushing session write buffer: {str(e)}")
+            for future in futures:
+                if not future.done():
+                    future.set_exception(e)
@@ -0,0 +1,97 @@
+from contextlib import asynccontextmanager
+from datetime import datetime, UTC
+from typing import Awaitable, Callable, Dict, Optional
+import asyncio
+import logging
+import os
+from models.database import Database
+from models.training_job import TrainingJob
+
+ProgressCallback = Callable[[str], Awaitable[None]]
+TrainingWork = Callable[[ProgressCallback], Awaitable[dict]]
+
+
+class TrainingJobRunner:
+    def __init__(self):
+        self.max_concurrency = max(1, int(os.getenv("TRAINING_MAX_CONCURRENCY", 2)))
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._agent_locks: Dict[str, list] = {}
+        self._tasks = set()
+
+    async def submit(self, db: Database, agent_id: str, kind: str, source: str, work: TrainingWork,
+                     cleanup_path: Optional[str] = None) -> dict:
+        job = await TrainingJob.create(db, agent_id, kind, source)
+        task = asyncio.create_task(self._run(db, job["_id"], agent_id, work))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        if cleanup_path:
+            task.add_done_callback(lambda _: self._remove(cleanup_path))
+        logging.info(f"Training job {job['_id']} queued for agent {agent_id} ({kind})")
+        return job
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            if os.path.exists(path):
+                os.unlink(path)
+        except OSError as e:
+            logging.error(f"Error removing training upload {path}: {str(e)}")
+
+    @asynccontextmanager
+    async def _agent_slot(self, agent_id: str):
+        entry = self._agent_locks.get(agent_id)
+        if entry is None:
+            entry = [asyncio.Lock(), 0]
+            self._agent_locks[agent_id] = entry
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                self._agent_locks.pop(agent_id, None)
+
+    async def _run(self, db: Database, job_id, agent_id: str, work: TrainingWork) -> None:
+        async def progress(stage: str) -> None:
+            await TrainingJob.update(db, job_id, {"stage": stage})
+
+        try:
+            async with self._agent_slot(agent_id):
+                async with self._semaphore:
+                    await TrainingJob.update(db, job_id, {
+                        "status": "running",
+                        "started_at": datetime.now(UTC)
+                    })
+                    result = await work(progress)
+            await TrainingJob.update(db, job_id, {
+                "status": "completed",
+                "stage": "done",
+                "result": result,
+                "finished_at": datetime.now(UTC)
+            })
+            logging.info(f"Training job {job_id} completed")
+        except asyncio.CancelledError:
+            await TrainingJob.update(db, job_id, {
+                "status": "interrupted",
+                "error": "The service stopped before the job finished",
+                "finished_at": datetime.now(UTC)
+            })
+            raise
+        except Exception as e:
+            logging.error(f"Training job {job_id} failed: {str(e)}")
+            await TrainingJob.update(db, job_id, {
+                "status": "failed",
+                "error": str(e),
+                "finished_at": datetime.now(UTC)
+            })
+
+    async def shutdown(self) -> None:
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+
+training_jobs = TrainingJobRunner()
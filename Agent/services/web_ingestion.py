@@ -0,0 +1,184 @@
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urldefrag, urljoin, urlparse
+from xml.etree import ElementTree
+import asyncio
+import hashlib
+import ipaddress
+import logging
+import math
+import os
+import zlib
+import httpx
+from services.csv_ingestion import ShardFile
+
+MAX_SITEMAP_DEPTH = 3
+MAX_SITEMAP_REDIRECTS = 3
+
+
+def page_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def dedupe_pages(pages: List[Tuple[str, str]]) -> Tuple[List[Tuple[str, str]], int]:
+    seen = set()
+    unique = []
+    for url, text in pages:
+        digest = page_hash(text)
+        if digest not in seen:
+            seen.add(digest)
+            unique.append((url, text))
+    return unique, len(pages) - len(unique)
+
+
+def pages_hash(pages: List[Tuple[str, str]]) -> str:
+    digest = hashlib.sha256()
+    for url, text in sorted(pages):
+        digest.update(f"{url}\n{page_hash(text)}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def pack_pages(pages: List[Tuple[str, str]], output_dir: str, pack_bytes: int) -> List[ShardFile]:
+    total_bytes = sum(len(text.encode("utf-8")) for _, text in pages)
+    bucket_count = 1 << max(0, math.ceil(math.log2(max(1, total_bytes / pack_bytes))))
+    buckets: Dict[int, List[Tuple[str, str]]] = {}
+    for url, text in sorted(pages):
+        buckets.setdefault(zlib.crc32(url.encode("utf-8")) % bucket_count, []).append((url, text))
+
+    shards = []
+    for bucket, bucket_pages in sorted(buckets.items()):
+        path = os.path.join(output_dir, f"pages-{bucket:05d}.txt")
+        with open(path, "w", encoding="utf-8") as pack_file:
+            for url, text in bucket_pages:
+                pack_file.write(f"Source: {url}\n\n{text.strip()}\n\n---\n\n")
+        shards.append(ShardFile(bucket=bucket, path=path, content_hash=pages_hash(bucket_pages), rows=len(bucket_pages)))
+    return shards
+
+
+class HostRateLimiter:
+    def __init__(self, requests_per_second: float):
+        self.interval = 1 / requests_per_second if requests_per_second > 0 else 0
+        self._next_slot: Dict[str, float] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    async def wait(self, host: str) -> None:
+        if not self.interval:
+            return
+        async with self._locks.setdefault(host, asyncio.Lock()):
+            now = asyncio.get_running_loop().time()
+            slot = max(self._next_slot.get(host, now), now)
+            if slot > now:
+                await asyncio.sleep(slot - now)
+            self._next_slot[host] = slot + self.interval
+
+
+class WebIngestion:
+    def __init__(self):
+        self.jina_api_key = os.getenv("JINA_API_KEY")
+        self.timeout = float(os.getenv("JINA_TIMEOUT", 60))
+        self.concurrency = max(1, int(os.getenv("WEB_INGESTION_CONCURRENCY", 8)))
+        self.host_rate = float(os.getenv("WEB_INGESTION_HOST_RPS", 2))
+        self.max_pages = int(os.getenv("WEB_INGESTION_MAX_PAGES", 500))
+        self.pack_bytes = int(os.getenv("WEB_INGESTION_PACK_BYTES", 2 * 1024 * 1024))
+
+    def _client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            timeout=self.timeout,
+            limits=httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency),
+            follow_redirects=True
+        )
+
+    @staticmethod
+    async def _ensure_public(url: str) -> None:
+        parsed = urlparse(url)
+        if parsed.scheme not in ("http", "https") or not parsed.hostname:
+            raise ValueError(f"Sitemap URL must be an absolute http(s) URL: {url}")
+        try:
+            addresses = await asyncio.get_running_loop().getaddrinfo(
+                parsed.hostname, parsed.port or (443 if parsed.scheme == "https" else 80)
+            )
+        except OSError as e:
+            raise ValueError(f"Could not resolve sitemap host {parsed.hostname}: {str(e)}")
+        for _, _, _, _, sockaddr in addresses:
+            address = ipaddress.ip_address(sockaddr[0].split("%")[0])
+            if not address.is_global:
+                raise ValueError(f"Sitemap host {parsed.hostname} resolves to a non-public address")
+
+    async def _get_public(self, client: httpx.AsyncClient, url: str) -> httpx.Response:
+        for _ in range(MAX_SITEMAP_REDIRECTS + 1):
+            await self._ensure_public(url)
+            response = await client.get(url, follow_redirects=False)
+            if not response.is_redirect:
+                response.raise_for_status()
+                return response
+            url = urljoin(url, response.headers["location"])
+        raise ValueError(f"Too many redirects while fetching sitemap {url}")
+
+    async def _sitemap_urls(self, client: httpx.AsyncClient, sitemap_url: str, depth: int = 0) -> List[str]:
+        response = await self._get_public(client, sitemap_url)
+        root = ElementTree.fromstring(response.content)
+        locations = [
+            element.text.strip()
+            for entry in root
+            for element in entry
+            if element.tag.split("}")[-1] == "loc" and element.text
+        ]
+        if not root.tag.endswith("sitemapindex"):
+            return locations
+        if depth >= MAX_SITEMAP_DEPTH:
+            return []
+
+        urls = []
+        for child_sitemap in locations:
+            if len(urls) >= self.max_pages:
+                break
+            urls.extend(await self._sitemap_urls(client, child_sitemap, depth + 1))
+        return urls
+
+    async def collect_urls(self, urls: List[str], sitemap: Optional[str] = None) -> List[str]:
+        candidates = list(urls)
+        if sitemap:
+            async with self._client() as client:
+                candidates.extend(await self._sitemap_urls(client, sitemap))
+
+        unique = []
+        seen = set()
+        for url in candidates:
+            url = urldefrag(url.strip())[0]
+            if url and url not in seen and urlparse(url).scheme in ("http", "https"):
+                seen.add(url)
+                unique.append(url)
+        if len(unique) > self.max_pages:
+            logging.warning(f"Limiting URL ingestion to {self.max_pages} of {len(unique)} pages")
+        return unique[:self.max_pages]
+
+    async def fetch_pages(self, urls: List[str],
+                          progress: Optional[Callable[[str], Awaitable[None]]] = None) -> Tuple[List[Tuple[str, str]], List[dict]]:
+        rate_limiter = HostRateLimiter(self.host_rate)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        headers = {"Authorization": f"Bearer {self.jina_api_key}"}
+        pages = []
+        failures = []
+
+        async def fetch(client: httpx.AsyncClient, url: str) -> None:
+            try:
+                await rate_limiter.wait(urlparse(url).netloc)
+                async with semaphore:
+                    response = await client.get(f"https://r.jina.ai/{url}", headers=headers)
+                if response.status_code != 200:
+                    raise Exception(f"HTTP {response.status_code}")
+                if not response.text.strip():
+                    raise Exception("No content obtained from URL")
+                pages.append((url, response.text))
+            except Exception as e:
+                failures.append({"url": url, "error": str(e)})
+
+            if progress and (len(pages) + len(failures)) % 25 == 0:
+                await progress(f"fetched {len(pages) + len(failures)} of {len(urls)} pages")
+
+        async with self._client() as client:
+            await asyncio.gather(*[fetch(client, url) for url in urls])
+
+        order = {url: position for position, url in enumerate(urls)}
+        pages.sort(key=lambda page: order[page[0]])
+        failures.sort(key=lambda failure: order[failure["url"]])
+        return pages, failures
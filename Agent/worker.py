@@ -0,0 +1,130 @@
+import logging
+import multiprocessing
+import os
+import signal
+import sys
+import threading
+import time
+from typing import List
+from dotenv import load_dotenv
+from services.queue_shards import queue_shards
+
+load_dotenv()
+
+LOG_FORMAT = '%(asctime)s - %(processName)s - %(name)s - %(levelname)s - %(message)s'
+
+
+def run_worker(worker_id: int, shards: List[int], drain_timeout: float):
+    logging.basicConfig(level=logging.INFO, format=LOG_FORMAT)
+
+    from services.queue_service import QueueService
+    from models.database import Database
+
+    stop_event = threading.Event()
+
+    def handle_stop(signum, frame):
+        logging.info(f"Worker {worker_id} received signal {signum}, draining")
+        stop_event.set()
+
+    signal.signal(signal.SIGTERM, handle_stop)
+    signal.signal(signal.SIGINT, handle_stop)
+
+    queue_service = QueueService(shards=shards)
+    consumer_thread = threading.Thread(target=queue_service.start_consuming, daemon=True)
+    consumer_thread.start()
+
+    while not stop_event.is_set() and consumer_thread.is_alive():
+        stop_event.wait(1)
+
+    if not stop_event.is_set():
+        logging.error(f"Worker {worker_id} consumer stopped unexpectedly")
+        queue_service.close()
+        sys.exit(1)
+
+    queue_service.drain(drain_timeout)
+    queue_service.close()
+    Database.close()
+    logging.info(f"Worker {worker_id} stopped")
+
+
+class WorkerSupervisor:
+    def __init__(self):
+        self.shards = queue_shards()
+        self.processes = max(1, int(os.getenv('AGENT_WORKER_PROCESSES', self.shards)))
+        if self.processes > self.shards:
+            logging.warning(
+                f"AGENT_WORKER_PROCESSES={self.processes} exceeds AGENT_QUEUE_SHARDS={self.shards}, "
+                f"starting {self.shards} workers"
+            )
+            self.processes = self.shards
+        self.drain_timeout = float(os.getenv('AGENT_WORKER_DRAIN_TIMEOUT', 30))
+        self.restart_delay = float(os.getenv('AGENT_WORKER_RESTART_DELAY', 5))
+        self._context = multiprocessing.get_context("spawn")
+        self._workers = {}
+        self._stopping = False
+
+    def _start_worker(self, worker_id: int):
+        process = self._context.Process(
+            target=run_worker,
+            args=(worker_id, self._worker_shards(worker_id), self.drain_timeout),
+            name=f"agent-worker-{worker_id}"
+        )
+        process.start()
+        self._workers[worker_id] = {"process": process, "restart_at": None}
+        logging.info(f"Started worker {worker_id} (pid {process.pid})")
+
+    def _worker_shards(self, worker_id: int) -> List[int]:
+        return [shard for shard in range(self.shards) if shard % self.processes == worker_id]
+
+    def _handle_stop(self, signum, frame):
+        logging.info(f"Supervisor received signal {signum}, stopping workers")
+        self._stopping = True
+
+    def _supervise(self):
+        now = time.monotonic()
+        for worker_id, worker in self._workers.items():
+            process = worker["process"]
+            if process.is_alive():
+                continue
+            if worker["restart_at"] is None:
+                logging.warning(
+                    f"Worker {worker_id} (pid {process.pid}) exited with code {process.exitcode}, "
+                    f"restarting in {self.restart_delay}s"
+                )
+                worker["restart_at"] = now + self.restart_delay
+            elif now >= worker["restart_at"]:
+                self._start_worker(worker_id)
+
+    def _shutdown(self):
+        for worker in self._workers.values():
+            if worker["process"].is_alive():
+                worker["process"].terminate()
+
+        deadline = time.monotonic() + self.drain_timeout + 5
+        for worker_id, worker in self._workers.items():
+            process = worker["process"]
+            process.join(max(0, deadline - time.monotonic()))
+            if process.is_alive():
+                logging.warning(f"Worker {worker_id} did not drain in time, killing it")
+                process.kill()
+                process.join()
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        signal.signal(signal.SIGINT, self._handle_stop)
+
+        logging.info(f"Starting {self.processes} agent queue workers for {self.shards} queue shards")
+        for worker_id in range(self.processes):
+            self._start_worker(worker_id)
+
+        while not self._stopping:
+            self._supervise()
+            time.sleep(1)
+
+        self._shutdown()
+        logging.info("All agent queue workers stopped")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format=LOG_FORMAT)
+    WorkerSupervisor().run()
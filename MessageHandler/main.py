@@ -2,8 +2,9 @@ from fastapi import FastAPI, Request, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 import logging
 from services.message_handler_service import MessageHandlerService
+from services.publish_buffer import PublishBuffer
 import threading
-import json
+import asyncio
 import os
 import uvicorn
 
@@ -25,6 +26,7 @@ app.add_middleware(
 )
 
 message_handler_service = MessageHandlerService()
+publish_buffer = PublishBuffer()
 
 def start_rabbitmq_consumer():
     try:
@@ -35,12 +37,14 @@ def start_rabbitmq_consumer():
 
 @app.on_event("startup")
 async def startup_event():
+    publish_buffer.start()
     consumer_thread = threading.Thread(target=start_rabbitmq_consumer)
     consumer_thread.daemon = True
     consumer_thread.start()
 
 @app.on_event("shutdown")
 async def shutdown_event():
+    await publish_buffer.close()
     message_handler_service.close()
 
 @app.get("/health")
@@ -50,34 +54,30 @@ async def health_check():
 @app.post("/webhook/whatsapp")
 async def whatsapp_webhook(request: Request):
     try:
-        raw_body = await request.body()
-        logging.info(f"Raw body received: {raw_body.decode('utf-8')}")
-        
-        try:
+        if request.headers.get("content-type", "").startswith("application/json"):
             body = await request.json()
-            logging.info(f"WhatsApp message received (JSON): {json.dumps(body, indent=2)}")
-        except json.JSONDecodeError:
-            form_data = await request.form()
-            body = dict(form_data)
-            logging.info(f"WhatsApp message received (Form): {json.dumps(body, indent=2)}")
-            
+        else:
+            body = dict(await request.form())
 
-            message_data = {
-                "channel": "whatsapp",
-                "message": body.get("Body", ""),
-                "from": body.get("From", ""),
-                "to": body.get("To", ""),
-                "profile_name": body.get("ProfileName", ""),
-                "message_type": body.get("MessageType", "text"),
-                "wa_id": body.get("WaId", ""),
-                "timestamp": body.get("MessageSid", ""),  
-                "status": body.get("SmsStatus", "")
-            }
-            
-            await message_handler_service.send_to_queue(message_data)
-            logging.info(f"Message sent to queue: {json.dumps(message_data, indent=2)}")
-        
+        message_data = {
+            "channel": "whatsapp",
+            "message": body.get("Body", ""),
+            "from": body.get("From", ""),
+            "to": body.get("To", ""),
+            "profile_name": body.get("ProfileName", ""),
+            "message_type": body.get("MessageType", "text"),
+            "wa_id": body.get("WaId", ""),
+            "timestamp": body.get("MessageSid", ""),
+            "message_sid": body.get("MessageSid", ""),
+            "status": body.get("SmsStatus", "")
+        }
+
+        publish_buffer.submit(message_data)
+        logging.info(f"WhatsApp message {message_data['message_sid']} queued for publishing")
         return {"status": "success"}
+    except asyncio.QueueFull:
+        logging.error("Publish buffer is full, rejecting WhatsApp webhook")
+        raise HTTPException(status_code=503, detail="Message buffer is full")
     except Exception as e:
         logging.error(f"Error in WhatsApp webhook: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
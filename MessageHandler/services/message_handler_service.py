@@ -4,9 +4,11 @@ import os
 import logging
 import threading
 import asyncio
-from typing import Dict, Any
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
 from dotenv import load_dotenv
 from services.whatsapp_service import WhatsAppService
+from services.retry_topology import declare_retry_topology, retry_delays, retry_or_dead_letter
 
 load_dotenv()
 
@@ -18,6 +20,9 @@ class MessageHandlerService:
         self._consuming = False
         self._lock = threading.Lock()
         self._loop = None
+        self._loop_thread = None
+        self._recipient_locks: Dict[str, list] = {}
+        self._inflight = set()
         
         self.input_queue = os.getenv("RABBITMQ_INPUT_QUEUE", "send_message")
         self.output_queue = os.getenv("RABBITMQ_OUTPUT_QUEUE", "receive_message")
@@ -27,7 +32,9 @@ class MessageHandlerService:
         self.rabbitmq_user = os.getenv("RABBITMQ_USER", "guest")
         self.rabbitmq_password = os.getenv("RABBITMQ_PASSWORD", "guest")
         
-        self._prefetch_count = 1
+        self._max_concurrency = max(1, int(os.getenv("TWILIO_MAX_CONCURRENCY", 20)))
+        self._prefetch_count = int(os.getenv("RABBITMQ_PREFETCH_COUNT", self._max_concurrency))
+        self._retry_delays = retry_delays()
         self.whatsapp_service = WhatsAppService()
 
     def connect(self):
@@ -53,11 +60,42 @@ class MessageHandlerService:
                     self._channel = self._connection.channel()
                     self._channel.queue.declare(self.input_queue, durable=True)
                     self._channel.queue.declare(self.output_queue, durable=True)
+                    declare_retry_topology(self._channel, self.output_queue, self._retry_delays)
                     logging.info("RabbitMQ connection established successfully")
         except Exception as e:
             logging.error(f"Error establishing connection to RabbitMQ: {str(e)}")
             raise
 
+    @asynccontextmanager
+    async def _recipient_slot(self, recipient: Optional[str]):
+        if not recipient:
+            yield
+            return
+
+        entry = self._recipient_locks.get(recipient)
+        if entry is None:
+            entry = [asyncio.Lock(), 0]
+            self._recipient_locks[recipient] = entry
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                self._recipient_locks.pop(recipient, None)
+
+    def _recipient(self, message) -> Optional[str]:
+        try:
+            message_data = json.loads(message.body)
+            return f"{message_data.get('to_number')}:{message_data.get('conversation_id')}"
+        except Exception:
+            return None
+
+    async def _dispatch(self, message):
+        async with self._recipient_slot(self._recipient(message)):
+            await self._process_message(message)
+
     async def _process_message(self, message):
         try:
             logging.info(f"New message received in queue {self.output_queue}")
@@ -76,14 +114,15 @@ class MessageHandlerService:
 
                 logging.info(f"Sending WhatsApp message from {from_number} to {to_number}")
                 
-                whatsapp_response = self.whatsapp_service.send_message(
+                whatsapp_response = await self.whatsapp_service.send_message(
                     from_number=from_number,
                     to_number=to_number,
                     message=message_text
                 )
                 
                 if whatsapp_response["status"] == "error":
-                    raise Exception(f"Error sending WhatsApp message: {whatsapp_response['error']}")
+                    error = f"Error sending WhatsApp message: {whatsapp_response['error']}"
+                    raise Exception(error) if whatsapp_response["retryable"] else ValueError(error)
                 
                 logging.info(f"WhatsApp message sent successfully: {whatsapp_response['message_sid']}")
             
@@ -91,24 +130,35 @@ class MessageHandlerService:
             
         except Exception as e:
             logging.error(f"Error processing message: {str(e)}")
-            message.reject(requeue=False)
+            self._retry_or_dead_letter(message, e, permanent=isinstance(e, ValueError))
+
+    def _retry_or_dead_letter(self, message, error: Exception, permanent: bool = False):
+        retry_or_dead_letter(self._channel, message, self.output_queue, self._retry_delays, error, permanent)
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+
+    def _start_loop(self):
+        self._loop = asyncio.new_event_loop()
+        self._loop_thread = threading.Thread(target=self._run_loop, daemon=True)
+        self._loop_thread.start()
 
     def start_consuming(self):
         try:
             self.setup_connection()
             self._channel.basic.qos(prefetch_count=self._prefetch_count)
             
-            self._loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(self._loop)
+            self._start_loop()
             
             def on_message(message):
                 try:
-                    self._loop.run_until_complete(
-                        self._process_message(message)
-                    )
+                    future = asyncio.run_coroutine_threadsafe(self._dispatch(message), self._loop)
+                    self._inflight.add(future)
+                    future.add_done_callback(self._inflight.discard)
                 except Exception as e:
-                    logging.error(f"Error processing message: {str(e)}")
-                    message.reject(requeue=True)
+                    logging.error(f"Error scheduling message: {str(e)}")
+                    self._retry_or_dead_letter(message, e)
             
             self._channel.basic.consume(
                 queue=self.output_queue,
@@ -116,7 +166,10 @@ class MessageHandlerService:
                 no_ack=False
             )
             
-            logging.info(f"Starting consumption of messages from queue: {self.output_queue}")
+            logging.info(
+                f"Starting consumption of messages from queue: {self.output_queue} "
+                f"(max concurrency: {self._max_concurrency}, prefetch: {self._prefetch_count})"
+            )
             self._consuming = True
             self._channel.start_consuming()
         except Exception as e:
@@ -132,28 +185,13 @@ class MessageHandlerService:
                 if self._connection and self._connection.is_open:
                     self._connection.close()
                 if self._loop and self._loop.is_running():
-                    self._loop.stop()
+                    asyncio.run_coroutine_threadsafe(
+                        self.whatsapp_service.close(), self._loop
+                    ).result(timeout=5)
+                    self._loop.call_soon_threadsafe(self._loop.stop)
             except Exception as e:
                 logging.error(f"Error closing connection: {str(e)}")
             finally:
                 logging.info("RabbitMQ connection closed")
                 self._closing = False
                 self._consuming = False
-
-    async def send_to_queue(self, message: Dict[str, Any]):
-        try:
-            with self._lock:
-                if self._connection is None or self._connection.is_closed:
-                    self.setup_connection()
-                
-                self._channel.basic.publish(
-                    body=json.dumps(message),
-                    routing_key=self.input_queue,
-                    properties={
-                        'delivery_mode': 2
-                    }
-                )
-                logging.info(f"Message sent to queue: {self.input_queue}")
-        except Exception as e:
-            logging.error(f"Error sending message to queue: {str(e)}")
-            raise 
\ No newline at end of file
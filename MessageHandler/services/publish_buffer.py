@@ -0,0 +1,125 @@
+import amqpstorm
+import asyncio
+import json
+import logging
+import os
+import threading
+from collections import deque
+from typing import Any, Dict, Optional
+from dotenv import load_dotenv
+from services.queue_shards import queue_shards, shard_for, shard_queue_name, shard_queue_names
+
+load_dotenv()
+
+class PublishBuffer:
+    def __init__(self):
+        self.queue = os.getenv("RABBITMQ_INPUT_QUEUE", "send_message")
+        self.shards = queue_shards()
+        self.rabbitmq_host = os.getenv("RABBITMQ_HOST", "rabbitmq")
+        self.rabbitmq_port = int(os.getenv("RABBITMQ_PORT", "5672"))
+        self.rabbitmq_user = os.getenv("RABBITMQ_USER", "guest")
+        self.rabbitmq_password = os.getenv("RABBITMQ_PASSWORD", "guest")
+
+        self.max_size = int(os.getenv("PUBLISH_BUFFER_MAX_SIZE", 10000))
+        self.batch_size = int(os.getenv("PUBLISH_BATCH_SIZE", 100))
+        self.batch_interval = float(os.getenv("PUBLISH_BATCH_INTERVAL_MS", 5)) / 1000
+        self.drain_timeout = float(os.getenv("PUBLISH_BUFFER_DRAIN_TIMEOUT", 10))
+        self.retry_delay = float(os.getenv("PUBLISH_RETRY_DELAY", 0.5))
+        self.max_retry_delay = float(os.getenv("PUBLISH_MAX_RETRY_DELAY", 10))
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._connection = None
+        self._channel = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        self._queue = asyncio.Queue(maxsize=self.max_size)
+        self._task = asyncio.create_task(self._run())
+
+    def _routing_key(self, message: Dict[str, Any]) -> str:
+        conversation_key = f"{message.get('to', '')}:{message.get('from', '')}"
+        return shard_queue_name(self.queue, shard_for(conversation_key, self.shards), self.shards)
+
+    def submit(self, message: Dict[str, Any]):
+        self._queue.put_nowait((self._routing_key(message), json.dumps(message)))
+
+    def _ensure_channel(self):
+        if self._connection is None or self._connection.is_closed:
+            self._connection = amqpstorm.Connection(
+                hostname=self.rabbitmq_host,
+                port=self.rabbitmq_port,
+                username=self.rabbitmq_user,
+                password=self.rabbitmq_password,
+                heartbeat=600,
+                timeout=30
+            )
+            self._channel = None
+        if self._channel is None or self._channel.is_closed:
+            self._channel = self._connection.channel()
+            for queue in shard_queue_names(self.queue, self.shards):
+                self._channel.queue.declare(queue, durable=True)
+            self._channel.confirm_deliveries()
+            logging.info("Publisher connection established with delivery confirms")
+        return self._channel
+
+    def _publish_batch(self, pending: deque):
+        with self._lock:
+            channel = self._ensure_channel()
+            while pending:
+                routing_key, body = pending[0]
+                message = amqpstorm.Message.create(channel, body, properties={'delivery_mode': 2})
+                if not message.publish(routing_key):
+                    raise amqpstorm.AMQPError("Message was not confirmed by the broker")
+                pending.popleft()
+
+    async def _collect_batch(self) -> deque:
+        batch = deque([await self._queue.get()])
+        deadline = asyncio.get_running_loop().time() + self.batch_interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            pending = await self._collect_batch()
+            size = len(pending)
+            delay = self.retry_delay
+            while pending:
+                try:
+                    await asyncio.to_thread(self._publish_batch, pending)
+                except Exception as e:
+                    logging.error(f"Error publishing {len(pending)} messages, retrying in {delay}s: {str(e)}")
+                    await asyncio.to_thread(self._close_connection)
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, self.max_retry_delay)
+            for _ in range(size):
+                self._queue.task_done()
+
+    def _close_connection(self):
+        with self._lock:
+            try:
+                if self._connection and self._connection.is_open:
+                    self._connection.close()
+            except Exception as e:
+                logging.error(f"Error closing publisher connection: {str(e)}")
+            finally:
+                self._connection = None
+                self._channel = None
+
+    async def close(self):
+        if self._task is None:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), self.drain_timeout)
+        except asyncio.TimeoutError:
+            logging.warning(f"Publish buffer closed with {self._queue.qsize()} unpublished messages")
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        await asyncio.to_thread(self._close_connection)
@@ -1,43 +1,126 @@
 import os
-from twilio.rest import Client
+import asyncio
+import random
+from typing import Dict, Optional
+import httpx
 from dotenv import load_dotenv
 import logging
-import time
 
 load_dotenv()
 
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated_at = None
+
+    async def acquire(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            now = loop.time()
+            if self._updated_at is not None:
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
 class WhatsAppService:
     def __init__(self):
         self.account_sid = os.getenv('TWILIO_ACCOUNT_SID')
         self.auth_token = os.getenv('TWILIO_AUTH_TOKEN')
-        self.client = Client(self.account_sid, self.auth_token)
-        self.max_retries = 3
-        self.retry_delay = 2
+        self.api_url = f"https://api.twilio.com/2010-04-01/Accounts/{self.account_sid}/Messages.json"
+        self.max_retries = int(os.getenv('TWILIO_MAX_RETRIES', 3))
+        self.retry_delay = float(os.getenv('TWILIO_RETRY_DELAY', 2))
+        self.max_retry_delay = float(os.getenv('TWILIO_MAX_RETRY_DELAY', 30))
+        self.max_concurrency = max(1, int(os.getenv('TWILIO_MAX_CONCURRENCY', 20)))
+        self.sender_rate = float(os.getenv('TWILIO_SENDER_RPS', 10))
+        self.sender_burst = float(os.getenv('TWILIO_SENDER_BURST', self.sender_rate))
+        self.timeout = float(os.getenv('TWILIO_TIMEOUT', 15))
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._buckets: Dict[str, TokenBucket] = {}
 
-    def send_message(self, from_number: str, to_number: str, message: str):
-        retries = 0
-        while retries < self.max_retries:
-            try:
-                message = self.client.messages.create(
-                    from_=f'whatsapp:+{to_number}',
-                    body=message,
-                    to=f'whatsapp:+{from_number}'
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                auth=(self.account_sid, self.auth_token),
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_concurrency,
+                    max_keepalive_connections=self.max_concurrency
                 )
-                logging.info(f"Message sent successfully with SID: {message.sid}")
-                return {
-                    'status': 'success',
-                    'message_sid': message.sid,
-                    'error': None
-                }
-
-            except Exception as e:
-                retries += 1
-                if retries == self.max_retries:
-                    logging.error(f"Error sending message after {self.max_retries} attempts: {str(e)}")
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._client
+
+    def _bucket(self, sender: str) -> Optional[TokenBucket]:
+        if self.sender_rate <= 0:
+            return None
+        bucket = self._buckets.get(sender)
+        if bucket is None:
+            bucket = TokenBucket(self.sender_rate, max(1, self.sender_burst))
+            self._buckets[sender] = bucket
+        return bucket
+
+    def _backoff(self, attempt: int, retry_after: Optional[str]) -> float:
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), self.max_retry_delay)
+        delay = min(self.retry_delay * 2 ** attempt, self.max_retry_delay)
+        return delay * random.uniform(0.5, 1.0)
+
+    async def send_message(self, from_number: str, to_number: str, message: str):
+        client = self._get_client()
+        bucket = self._bucket(to_number)
+        error = None
+        retryable = True
+
+        for attempt in range(self.max_retries):
+            retry_after = None
+            try:
+                if bucket:
+                    await bucket.acquire()
+                async with self._semaphore:
+                    response = await client.post(self.api_url, data={
+                        'From': f'whatsapp:+{to_number}',
+                        'Body': message,
+                        'To': f'whatsapp:+{from_number}'
+                    })
+
+                if response.status_code in (200, 201):
+                    message_sid = response.json().get('sid')
+                    logging.info(f"Message sent successfully with SID: {message_sid}")
                     return {
-                        'status': 'error',
-                        'message_sid': None,
-                        'error': str(e)
+                        'status': 'success',
+                        'message_sid': message_sid,
+                        'error': None,
+                        'retryable': False
                     }
-                logging.warning(f"Attempt {retries} failed, retrying in {self.retry_delay} seconds...")
-                time.sleep(self.retry_delay) 
\ No newline at end of file
+
+                error = f"Twilio returned {response.status_code}: {response.text}"
+                if response.status_code != 429 and response.status_code < 500:
+                    retryable = False
+                    break
+                retry_after = response.headers.get('Retry-After')
+            except httpx.TransportError as e:
+                error = str(e)
+
+            if attempt + 1 < self.max_retries:
+                delay = self._backoff(attempt, retry_after)
+                logging.warning(f"Attempt {attempt + 1} failed, retrying in {delay:.1f} seconds: {error}")
+                await asyncio.sleep(delay)
+
+        logging.error(f"Error sending message after {attempt + 1} attempts: {error}")
+        return {
+            'status': 'error',
+            'message_sid': None,
+            'error': error,
+            'retryable': retryable
+        }
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None